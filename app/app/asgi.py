@@ -2,6 +2,11 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Views run on the bounded thread pool of core.asgi, configured by the
+ASGI_THREADS setting. Recipe images left unprocessed by the previous
+process are queued again on startup. Serve it with an ASGI server, e.g.:
+
+    uvicorn app.asgi:application --host 0.0.0.0 --port 8000
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +14,13 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# Resume the image processing interrupted by the previous process
+from recipe.images import image_queue  # noqa: E402
+
+image_queue.requeue_in_background()
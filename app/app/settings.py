@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'user',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,13 +80,20 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Connections come from a per-process pool of the core.db backends,
+# POOL MAX_SIZE is set below the thread settings, covering every thread
+# that holds a connection
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'POOL': {
+            'MAX_AGE': 300,
+            'TIMEOUT': 10,
+        },
     }
 }
 
@@ -131,4 +140,90 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Uploads are written here first, on the same file system as MEDIA_ROOT
+# they are moved into place with a rename instead of a copy
+FILE_UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR')
+
+# Media files served by core.views.serve_media
+# SENDFILE leaves sending the bytes to a front proxy: 'x-accel-redirect'
+# for nginx, with ACCEL_PREFIX an internal location aliased to
+# MEDIA_ROOT, or 'x-sendfile' for Apache and lighttpd. Without it, under
+# ASGI files are read in BLOCK_SIZE chunks on the view thread pool, so
+# set MEDIA_SENDFILE in production.
+# Files in PRIVATE_DIRS, relative to MEDIA_ROOT, are never served
+MEDIA_SERVING = {
+    'SENDFILE': os.environ.get('MEDIA_SENDFILE'),
+    'PRIVATE_DIRS': ('uploads/raw',),
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 3600,
+    'BLOCK_SIZE': 64 * 1024,
+}
+
 AUTH_USER_MODEL = 'core.User'
+
+# Token authentication cache used by core.authentication
+# SHARED_CACHE is the alias of a django cache shared by every process
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+}
+
+# Versioned response cache used by the recipe app
+# CACHE must be shared by every process when running more than one
+RECIPE_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+}
+
+# Readiness checks of core.views.readyz, the result is reused for
+# CACHE_SECONDS so that frequent probes do not load the dependencies
+HEALTH_CHECKS = {
+    'CACHE_SECONDS': 2,
+}
+
+# Thread pool running the synchronous views under ASGI, see core.asgi
+# WORKERS, with the IMAGE_PROCESSING ones, bounds the database
+# connections of each process; views in LIMITS run at most that many
+# requests at a time
+ASGI_THREADS = {
+    'WORKERS': int(os.environ.get('ASGI_WORKERS', 16)),
+    'LIMITS': {
+        'recipe:recipe-upload-image': 4,
+        'recipe:recipe-image-rendition': 8,
+        'recipe:recipe-export': 2,
+    },
+}
+
+# Limits of recipe image uploads, checked before anything is decoded
+IMAGE_UPLOAD = {
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40 * 1000 * 1000,
+}
+
+# Background processing of recipe image uploads by recipe.images
+# At most QUEUE_SIZE uploads wait, further uploads are answered with 503
+# Uploads wait in RAW_DIR under MEDIA_ROOT, one of the MEDIA_SERVING
+# PRIVATE_DIRS as they still carry their metadata
+IMAGE_PROCESSING = {
+    'WORKERS': 2,
+    'QUEUE_SIZE': 100,
+    'RAW_DIR': 'uploads/raw',
+}
+
+# Each view thread and image worker may hold a database connection, and
+# the thread requeueing unfinished images on startup one more
+DATABASES['default']['POOL']['MAX_SIZE'] = int(os.environ.get(
+    'DB_POOL_SIZE',
+    ASGI_THREADS['WORKERS'] + IMAGE_PROCESSING['WORKERS'] + 1
+))
+
+# Disk cache of resized recipe images used by recipe.renditions
+# Past MAX_BYTES the least recently used are evicted down to LOW_WATER
+IMAGE_RENDITIONS = {
+    'ROOT': '/vol/web/cache/renditions',
+    'MAX_BYTES': 512 * 1024 * 1024,
+    'LOW_WATER': 0.9,
+    'WIDTHS': (64, 128, 256, 512, 1024),
+    'DEFAULT_QUALITY': 80,
+}
@@ -14,12 +14,18 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import healthz, readyz, serve_media
+
 urlpatterns = [
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(settings.STATIC_ROOT, document_root=settings.MEDIA_ROOT)
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'),
+            serve_media, name='media'),
+] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
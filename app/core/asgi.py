@@ -0,0 +1,223 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+
+
+# Parts of a streaming response read ahead of the client
+STREAM_QUEUE_SIZE = 4
+
+
+class BoundedASGIHandler(ASGIHandler):
+    """
+    ASGI handler running the synchronous middleware and views on a
+    thread pool of ASGI_THREADS['WORKERS'] threads, which also bounds
+    the database connections of the process. Views named in
+    ASGI_THREADS['LIMITS'] run at most that many at a time; further
+    requests wait in the event loop without holding a thread, so slow
+    endpoints can not take up the whole pool. Streaming responses are
+    iterated on one pool thread each, as their content may query the
+    database, and stay within the limit of their view until sent.
+    """
+
+    def __init__(self):
+        super().__init__()
+        options = settings.ASGI_THREADS
+        self.executor = ThreadPoolExecutor(
+            max_workers=options['WORKERS'],
+            thread_name_prefix='asgi-view'
+        )
+        self.limits = options['LIMITS']
+        self.semaphores = {}
+
+    def get_semaphore(self, request):
+        """
+        Return the semaphore limiting the concurrency of a request's view
+        :param request: request object
+        :return: asyncio.Semaphore or None without a limit
+        """
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if view_name not in self.limits:
+            return None
+        if view_name not in self.semaphores:
+            self.semaphores[view_name] = asyncio.Semaphore(
+                self.limits[view_name]
+            )
+
+        return self.semaphores[view_name]
+
+    async def run_in_executor(self, func, *args):
+        """
+        Run a synchronous function on the thread pool, in a copy of the
+        current context like asgiref's sync_to_async
+        :param func: function
+        :param args: positional arguments
+        :return: result of the function
+        """
+        loop = asyncio.get_event_loop()
+        context = contextvars.copy_context()
+
+        return await loop.run_in_executor(
+            self.executor, partial(context.run, func, *args)
+        )
+
+    def get_response_sync(self, request):
+        """
+        Return the response of the synchronous handler. Database
+        connections are checked before and after the request like under
+        WSGI; streaming content is iterated by stream_sync, which manages
+        the connection of its own thread.
+        :param request: request object
+        :return: response object
+        """
+        close_old_connections()
+        response = super().get_response(request)
+        close_old_connections()
+
+        return response
+
+    async def get_response(self, request):
+        """
+        Return the response of a request, run on the thread pool within
+        the concurrency limit of its view. The limit of a streaming
+        response is held until its content is sent.
+        :param request: request object
+        :return: response object
+        """
+        semaphore = self.get_semaphore(request)
+        if semaphore is None:
+            return await self.run_in_executor(self.get_response_sync,
+                                              request)
+        await semaphore.acquire()
+        try:
+            response = await self.run_in_executor(self.get_response_sync,
+                                                  request)
+        except BaseException:
+            semaphore.release()
+            raise
+        if response.streaming:
+            response.asgi_semaphore = semaphore
+        else:
+            semaphore.release()
+
+        return response
+
+    def stream_sync(self, response, loop, queue, stopped):
+        """
+        Iterate streaming content on one pool thread, handing the parts
+        to the event loop through a queue. Its database connection, and
+        any server-side cursor open on it, is used by this response only
+        until the stream ends and the response is closed, which releases
+        the connection as at the end of a request.
+        :param response: streaming response object
+        :param loop: event loop sending the response
+        :param queue: bounded asyncio.Queue of parts, an exception, or
+        None once the content ends
+        :param stopped: threading.Event set when the client is gone
+        :return: None
+        """
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        end = None
+        try:
+            for part in response:
+                if stopped.is_set():
+                    break
+                put(part)
+        except Exception as exc:
+            end = exc
+        finally:
+            try:
+                response.close()
+                close_old_connections()
+            finally:
+                put(end)
+
+    async def send_response(self, response, send):
+        """
+        Send a response, iterating streaming content on the thread pool
+        :param response: response object
+        :param send: ASGI send callable
+        :return: None
+        """
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        semaphore = getattr(response, 'asgi_semaphore', None)
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stopped = threading.Event()
+        stream = self.run_in_executor(self.stream_sync, response,
+                                      asyncio.get_event_loop(), queue,
+                                      stopped)
+        stream = asyncio.ensure_future(stream)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': self.get_response_headers(response),
+            })
+            while True:
+                part = await queue.get()
+                if part is None:
+                    break
+                if isinstance(part, Exception):
+                    raise part
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            stopped.set()
+            # Unblock the stream thread until it has closed the response
+            while not stream.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.wait([stream], timeout=0.01)
+            if semaphore is not None:
+                semaphore.release()
+
+    def get_response_headers(self, response):
+        """
+        Return the headers of a response for the ASGI response start
+        :param response: response object
+        :return: list of tuples of the header name and value bytes
+        """
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', cookie.output(header='').encode('ascii')
+                 .strip())
+            )
+
+        return response_headers
+
+
+def get_asgi_application():
+    """
+    Set up Django and return the ASGI application
+    :return: BoundedASGIHandler object
+    """
+    django.setup(set_prefix=False)
+
+    return BoundedASGIHandler()
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+
+def _clone(instance):
+    """
+    Return a new instance of a model with the same field values, sharing
+    no state like related object or prefetch caches with the original
+    :param instance: model instance
+    :return: model instance
+    """
+    fields = instance._meta.concrete_fields
+
+    return type(instance).from_db(
+        instance._state.db,
+        [field.attname for field in fields],
+        [getattr(instance, field.attname) for field in fields]
+    )
+
+
+def _clone_entry(user, token):
+    """
+    Return independent copies of a cached user and token
+    :param user: user object
+    :param token: token object
+    :return: (user, token)
+    """
+    user = _clone(user)
+    token = _clone(token)
+    token.user = user
+
+    return user, token
+
+
+class TokenCache:
+    """
+    In-process LRU cache of token key to (user, token) with a TTL,
+    optionally backed by a shared django cache so that other processes
+    can skip the database as well. Invalidation clears the shared tier
+    and the local tier of the current process; the local tier of other
+    processes expires within the TTL.
+    """
+    key_prefix = 'auth-token'
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def options(self):
+        """
+        Return the TOKEN_AUTH_CACHE settings
+        :return: dict of options
+        """
+        return settings.TOKEN_AUTH_CACHE
+
+    def _shared_cache(self):
+        """
+        Return the shared cache tier if one is configured
+        :return: cache object or None
+        """
+        alias = self.options.get('SHARED_CACHE')
+        if alias is None:
+            return None
+
+        return caches[alias]
+
+    def _shared_key(self, key):
+        """
+        Return the shared cache key for a token key
+        :param key: token key
+        :return: cache key
+        """
+        return f'{self.key_prefix}:{key}'
+
+    def get(self, key):
+        """
+        Return copies of the cached (user, token) for a token key, so
+        requests never share or modify the cached instances
+        :param key: token key
+        :return: (user, token) or None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return _clone_entry(entry[1], entry[2])
+                del self._entries[key]
+
+        shared_cache = self._shared_cache()
+        if shared_cache is None:
+            return None
+        cached = shared_cache.get(self._shared_key(key))
+        if cached is None:
+            return None
+        self._store(key, *cached)
+
+        return _clone_entry(*cached)
+
+    def set(self, key, user, token):
+        """
+        Cache the user and token for a token key
+        :param key: token key
+        :param user: user object
+        :param token: token object
+        :return: None
+        """
+        user, token = _clone_entry(user, token)
+        self._store(key, user, token)
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(
+                self._shared_key(key),
+                (user, token),
+                self.options['TTL']
+            )
+
+    def _store(self, key, user, token):
+        """
+        Store an entry in the local tier, evicting the least
+        recently used entries above the maximum size
+        :param key: token key
+        :param user: user object
+        :param token: token object
+        :return: None
+        """
+        expires = time.monotonic() + self.options['TTL']
+        with self._lock:
+            self._entries[key] = (expires, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.options['MAX_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Drop a token key from both tiers
+        :param key: token key
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self._shared_key(key))
+
+    def invalidate_user(self, user_id, keys=()):
+        """
+        Drop every local entry of a user along with the given token keys
+        :param user_id: id of the user
+        :param keys: token keys of the user
+        :return: None
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry[1].pk == user_id]
+        for key in set(stale) | set(keys):
+            self.invalidate(key)
+
+    def clear(self):
+        """
+        Drop every entry of the local tier
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token lookup, saving the
+    Token and User query on every authenticated request
+    """
+
+    def authenticate_credentials(self, key):
+        """
+        Return the user and token for a key, from the cache if possible
+        :param key: token key
+        :return: (user, token)
+        """
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+
+        return user, token
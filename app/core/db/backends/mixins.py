@@ -0,0 +1,130 @@
+from functools import partial
+
+from core.db.pool import DEFAULT_OPTIONS, PoolTimeout, close_pools, get_pool
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database wrapper mixin taking connections from the process pool of
+    its database instead of opening them, and returning them to it on
+    close. The pool is configured by the POOL dict of the database
+    settings, see core.db.pool.DEFAULT_OPTIONS.
+    """
+    pool = None
+    default_pool_options = {}
+    # Connection parameters that only bound opening a connection, so
+    # connections opened with any of their values are interchangeable
+    pool_key_ignored_params = ()
+
+    @property
+    def pool_options(self):
+        """
+        Return the POOL options of the database settings
+        :return: dict of options
+        """
+        return {**DEFAULT_OPTIONS, **self.default_pool_options,
+                **self.settings_dict.get('POOL', {})}
+
+    def get_pool_key(self, conn_params):
+        """
+        Return the key of the pool of some connection parameters
+        :param conn_params: connection parameters
+        :return: str
+        """
+        return repr(sorted(
+            item for item in conn_params.items()
+            if item[0] not in self.pool_key_ignored_params
+        ))
+
+    def get_new_connection(self, conn_params):
+        """
+        Check out a connection from the pool of the connection parameters
+        :param conn_params: connection parameters
+        :return: DB-API connection
+        """
+        self.pool = get_pool(self.alias, self.get_pool_key(conn_params),
+                             self.pool_options)
+        try:
+            connection = self.pool.checkout(
+                partial(super().get_new_connection, conn_params),
+                self.check_pooled_connection
+            )
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+        self.prepare_pooled_connection(connection)
+
+        return connection
+
+    def check_pooled_connection(self, connection):
+        """
+        Return whether a pooled connection still works
+        :param connection: DB-API connection
+        :return: bool
+        """
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+
+        return True
+
+    def prepare_pooled_connection(self, connection):
+        """
+        Set up the wrapper for a connection taken from the pool
+        :param connection: DB-API connection
+        :return: None
+        """
+
+    def reset_pooled_connection(self, connection):
+        """
+        Reset the session of a connection going back to the pool.
+        Connections closed in a transaction are not reused.
+        :param connection: DB-API connection
+        :return: whether the connection can be reused
+        """
+        if self.in_atomic_block or not self.autocommit:
+            return False
+        reset_query = self.pool_options['RESET_QUERY']
+        try:
+            connection.rollback()
+            if reset_query:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(reset_query)
+                finally:
+                    cursor.close()
+        except self.Database.Error:
+            return False
+
+        return True
+
+    def _close(self):
+        """
+        Return the connection to the pool, or close it if it is broken
+        :return: None
+        """
+        if self.connection is None:
+            return
+        self.pool.checkin(self.connection,
+                          self.reset_pooled_connection(self.connection))
+
+
+class PooledDatabaseCreationMixin:
+    """
+    Database creation mixin closing the pooled connections of the test
+    database before it is destroyed
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        """
+        Close the pooled connections, then destroy the test database
+        :param test_database_name: name of the test database
+        :param verbosity: verbosity level
+        :return: None
+        """
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,30 @@
+from django.db.backends.postgresql import base, creation
+
+from core.db.backends.mixins import (PooledDatabaseCreationMixin,
+                                     PooledDatabaseWrapperMixin)
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin,
+                       creation.DatabaseCreation):
+    pass
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    PostgreSQL backend with pooled connections. Sessions are reset with
+    the POOL RESET_QUERY, DISCARD ALL unless configured otherwise.
+    """
+    creation_class = DatabaseCreation
+    default_pool_options = {'RESET_QUERY': 'DISCARD ALL'}
+    pool_key_ignored_params = ('connect_timeout',)
+
+    def prepare_pooled_connection(self, connection):
+        """
+        Read the isolation level of a pooled connection, like Django does
+        for new connections
+        :param connection: psycopg2 connection
+        :return: None
+        """
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level',
+                                           connection.isolation_level)
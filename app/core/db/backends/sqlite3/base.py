@@ -0,0 +1,18 @@
+from django.db.backends.sqlite3 import base, creation
+
+from core.db.backends.mixins import (PooledDatabaseCreationMixin,
+                                     PooledDatabaseWrapperMixin)
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin,
+                       creation.DatabaseCreation):
+    pass
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    SQLite backend with pooled connections, standing in for PostgreSQL
+    in local runs and tests. In-memory databases are never closed by
+    Django, so their single connection is kept as is.
+    """
+    creation_class = DatabaseCreation
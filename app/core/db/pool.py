@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import namedtuple
+
+
+PoolEntry = namedtuple('PoolEntry', ('connection', 'created_at'))
+
+DEFAULT_OPTIONS = {
+    'MAX_SIZE': 10,
+    'MAX_AGE': 300,
+    'TIMEOUT': 10,
+    'RESET_QUERY': None,
+}
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out within the timeout
+    """
+
+
+class ConnectionPool:
+    """
+    Pool of at most MAX_SIZE database connections shared by the threads
+    of a process. Idle connections are reused most recently returned
+    first and health checked before being handed out; connections older
+    than MAX_AGE seconds are closed instead of reused. When every
+    connection is in use, checkouts wait up to TIMEOUT seconds.
+    """
+
+    def __init__(self, max_size, max_age, timeout):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._idle = []
+        self._in_use = {}
+        self._connecting = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    @property
+    def size(self):
+        """
+        Return the number of open connections, idle or in use
+        :return: int
+        """
+        return len(self._idle) + len(self._in_use) + self._connecting
+
+    def _expired(self, entry):
+        """
+        Return whether a connection is past its maximum age
+        :param entry: PoolEntry
+        :return: bool
+        """
+        return self.max_age is not None and \
+            time.monotonic() - entry.created_at > self.max_age
+
+    def _reserve(self):
+        """
+        Take an idle connection or room for a new one, waiting while the
+        pool is full. Expired idle connections are closed on the way.
+        :return: PoolEntry, or None to open a new connection
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._condition:
+            while True:
+                while self._idle:
+                    entry = self._idle.pop()
+                    if not self._expired(entry):
+                        break
+                    self._stats['recycled'] += 1
+                    self._close(entry.connection)
+                else:
+                    entry = None
+                if entry is not None or self.size < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available after '
+                        f'{self.timeout} seconds, {self.max_size} in use'
+                    )
+                waited = True
+                self._condition.wait(remaining)
+
+            if entry is None:
+                # Counts towards the size while connecting
+                self._connecting += 1
+            else:
+                self._in_use[id(entry.connection)] = entry
+            wait_time = time.monotonic() - start
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += wait_time
+                self._stats['max_wait_time'] = max(
+                    self._stats['max_wait_time'], wait_time
+                )
+
+        return entry
+
+    def _close(self, connection):
+        """
+        Close a connection, ignoring errors of broken connections
+        :param connection: DB-API connection
+        :return: None
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def checkout(self, connect, check):
+        """
+        Return a healthy connection, reusing an idle one if possible
+        :param connect: function opening a new connection
+        :param check: function returning whether a connection is usable
+        :return: DB-API connection
+        """
+        while True:
+            entry = self._reserve()
+            if entry is None:
+                try:
+                    connection = connect()
+                finally:
+                    with self._condition:
+                        self._connecting -= 1
+                        self._condition.notify()
+                with self._condition:
+                    self._in_use[id(connection)] = PoolEntry(
+                        connection, time.monotonic()
+                    )
+                    self._stats['created'] += 1
+                return connection
+            if check(entry.connection):
+                return entry.connection
+            with self._condition:
+                del self._in_use[id(entry.connection)]
+                self._stats['discarded'] += 1
+                self._condition.notify()
+            self._close(entry.connection)
+
+    def checkin(self, connection, reusable=True):
+        """
+        Return a connection to the pool, closing it when it is not
+        reusable or too old
+        :param connection: DB-API connection from checkout
+        :param reusable: whether the connection is in a clean state
+        :return: None
+        """
+        with self._condition:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is None:
+                # Checked out before the pool was closed
+                self._close(connection)
+            elif reusable and not self._expired(entry):
+                self._idle.append(entry)
+            else:
+                self._stats['recycled' if reusable else 'discarded'] += 1
+                self._close(connection)
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close the idle connections. Connections in use are closed when
+        they are returned.
+        :return: None
+        """
+        with self._condition:
+            for entry in self._idle:
+                self._close(entry.connection)
+            self._idle = []
+            self._in_use = {}
+
+    def stats(self):
+        """
+        Return the pool size and the counters of its checkouts. wait_time
+        is the total seconds checkouts waited for a free connection.
+        :return: dict
+        """
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self._stats,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, options):
+    """
+    Return the pool of a database alias and its connection parameters,
+    creating it on first use
+    :param alias: database alias
+    :param key: hashable of the connection parameters
+    :param options: POOL options of the database settings
+    :return: ConnectionPool object
+    """
+    with _pools_lock:
+        if (alias, key) not in _pools:
+            options = {**DEFAULT_OPTIONS, **options}
+            _pools[alias, key] = ConnectionPool(options['MAX_SIZE'],
+                                                options['MAX_AGE'],
+                                                options['TIMEOUT'])
+
+        return _pools[alias, key]
+
+
+def close_pools(alias=None):
+    """
+    Close the idle connections of the pools of a database alias
+    :param alias: database alias, None for every pool
+    :return: None
+    """
+    with _pools_lock:
+        pools = [pool for (pool_alias, _), pool in _pools.items()
+                 if alias is None or pool_alias == alias]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """
+    Return the statistics of every pool by database alias, summed over
+    the pools of an alias
+    :return: dict of alias to stats
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    stats = {}
+    for (alias, _), pool in pools:
+        pool_stats = pool.stats()
+        if alias in stats:
+            for name, value in pool_stats.items():
+                if name == 'max_wait_time':
+                    value = max(value, stats[alias][name])
+                else:
+                    value += stats[alias][name]
+                stats[alias][name] = value
+        else:
+            stats[alias] = pool_stats
+
+    return stats
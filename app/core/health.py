@@ -0,0 +1,122 @@
+import tempfile
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+
+def check_database(alias):
+    """
+    Run a query on a database
+    :param alias: database alias
+    :return: None
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_media():
+    """
+    Write and remove a file in MEDIA_ROOT
+    :return: None
+    """
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT,
+                                     prefix='.readyz-') as file:
+        file.write(b'ok')
+        file.flush()
+
+
+def check_cache(alias):
+    """
+    Store a value in a cache and read it back
+    :param alias: cache alias
+    :return: None
+    """
+    cache = caches[alias]
+    key = f'readyz:{threading.get_ident()}'
+    cache.set(key, 'ok', 10)
+    if cache.get(key) != 'ok':
+        raise RuntimeError('value not read back')
+
+
+def get_checks():
+    """
+    Return the readiness checks: every database and cache, and the
+    media volume
+    :return: dict of name to function
+    """
+    checks = {}
+    for alias in settings.DATABASES:
+        checks[f'database:{alias}'] = partial(check_database, alias)
+    checks['media'] = check_media
+    for alias in settings.CACHES:
+        checks[f'cache:{alias}'] = partial(check_cache, alias)
+
+    return checks
+
+
+def run_checks(checks):
+    """
+    Run checks, timing each
+    :param checks: dict of name to function
+    :return: tuple of whether all passed and the results by name
+    """
+    ready = True
+    results = {}
+    for name, check in checks.items():
+        start = time.monotonic()
+        try:
+            check()
+        except Exception as exc:
+            ready = False
+            result = {'status': 'error', 'error': str(exc).strip()}
+        else:
+            result = {'status': 'ok'}
+        result['latency_ms'] = round((time.monotonic() - start) * 1000, 3)
+        results[name] = result
+
+    return ready, results
+
+
+class ReadinessCache:
+    """
+    Result of the readiness checks, kept for HEALTH_CHECKS
+    ['CACHE_SECONDS'] so that probes do not load the dependencies.
+    Only one thread runs the checks at a time, the others get the
+    result it finds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = None
+
+    def get(self):
+        """
+        Return the readiness result, running the checks when it expired
+        :return: tuple of whether ready, the results and their age
+        """
+        max_age = settings.HEALTH_CHECKS['CACHE_SECONDS']
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._checked_at > max_age:
+                self._result = run_checks(get_checks())
+                self._checked_at = now = time.monotonic()
+            ready, results = self._result
+
+            return ready, results, now - self._checked_at
+
+    def clear(self):
+        """
+        Forget the cached result
+        :return: None
+        """
+        with self._lock:
+            self._result = None
+
+
+readiness_cache = ReadinessCache()
@@ -1,24 +1,122 @@
+import math
+import random
 import time
 
+from django.conf import settings
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """
     Django command to pause execution until database is available
     """
+    help = 'Wait until the databases answer a query'
 
-    def handle(self, *args, **options):
-        self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Alias of a database to wait for, may be repeated. '
+                 'Defaults to every configured database.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait for all the databases in total'
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.1,
+            help='Seconds before the first retry, doubled on every retry'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Most seconds between two retries'
+        )
+
+    def ping(self, alias, timeout):
+        """
+        Open a new connection to a database and run a query on it. On
+        PostgreSQL the connection attempt is bounded by libpq's
+        connect_timeout, in whole seconds and at least 2.
+        :param alias: database alias
+        :param timeout: seconds the attempt may take
+        :return: tuple of the connect and query seconds
+        """
+        connection = connections[alias]
+        connection.close()
+        options = connection.settings_dict.setdefault('OPTIONS', {})
+        configured = options.get('connect_timeout')
+        if connection.vendor == 'postgresql':
+            options['connect_timeout'] = max(math.ceil(timeout), 2)
+        try:
+            start = time.monotonic()
+            connection.ensure_connection()
+            connected = time.monotonic()
+        finally:
+            if configured is None:
+                options.pop('connect_timeout', None)
+            else:
+                options['connect_timeout'] = configured
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+        return connected - start, time.monotonic() - connected
+
+    def get_delay(self, attempt, options):
+        """
+        Return the delay before a retry, growing exponentially up to the
+        maximum delay, randomised over its upper half so that containers
+        started together do not retry in step
+        :param attempt: number of the failed attempt, from 1
+        :param options: command options
+        :return: seconds
+        """
+        delay = min(options['max_delay'],
+                    options['initial_delay'] * 2 ** (attempt - 1))
+
+        return random.uniform(delay / 2, delay)
+
+    def wait_for(self, alias, deadline, options):
+        """
+        Wait until a database answers a query or the deadline passes
+        :param alias: database alias
+        :param deadline: time.monotonic() value to give up at
+        :param options: command options
+        :return: None
+        """
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, '
-                                  'retrying in a second...')
-                time.sleep(1)
+                connect_time, query_time = self.ping(
+                    alias, deadline - time.monotonic()
+                )
+                break
+            except OperationalError as exc:
+                connections[alias].close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database {alias} unavailable after '
+                        f'{options["timeout"]:g}s: {exc}'
+                    )
+                delay = min(self.get_delay(attempt, options), remaining)
+                reason = str(exc).strip().split('\n')[0]
+                self.stdout.write(f'Database {alias} unavailable ({reason}), '
+                                  f'retrying in {delay:.2f}s...')
+                time.sleep(delay)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Database {alias} available! connect {connect_time * 1000:.1f}'
+            f'ms, query {query_time * 1000:.1f}ms, attempts {attempt}'
+        ))
 
-        self.stdout.write(self.style.SUCCESS('Database available!'))
+    def handle(self, *args, **options):
+        aliases = options['databases'] or list(settings.DATABASES)
+        deadline = time.monotonic() + options['timeout']
+        self.stdout.write('Waiting for database...')
+        for alias in aliases:
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database {alias}')
+            self.wait_for(alias, deadline, options)
@@ -0,0 +1,23 @@
+from core.views import healthz, readyz
+
+
+class HealthCheckMiddleware:
+    """
+    Answer the health check paths before the rest of the middleware,
+    so probes skip sessions, authentication, CSRF and host checks.
+    Must come first in MIDDLEWARE.
+    """
+    views = {
+        '/healthz': healthz,
+        '/readyz': readyz,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = self.views.get(request.path_info.rstrip('/'))
+        if view is not None:
+            return view(request)
+
+        return self.get_response(request)
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    Merge the tags and ingredients of a user whose names only differ by
+    case into the oldest one, moving their recipe links over to it
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'),
+                                   ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        column = f'{model._meta.model_name}_id'
+
+        kept = {}
+        for obj in model.objects.annotate(normalized=Lower('name')).\
+                order_by('id'):
+            key = (obj.user_id, obj.normalized)
+            if key not in kept:
+                kept[key] = obj.id
+                continue
+
+            duplicate_id, kept_id = obj.id, kept[key]
+            linked = through.objects.filter(**{column: kept_id}).\
+                values_list('recipe_id', flat=True)
+            through.objects.filter(**{column: duplicate_id}).\
+                exclude(recipe_id__in=linked).update(**{column: kept_id})
+            model.objects.filter(id=duplicate_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_api_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql='CREATE UNIQUE INDEX core_tag_user_normalized_name_uniq '
+                'ON core_tag (user_id, lower(name))',
+            reverse_sql='DROP INDEX core_tag_user_normalized_name_uniq',
+        ),
+        migrations.RunSQL(
+            sql='CREATE UNIQUE INDEX core_ingredient_user_normalized_name_uniq '
+                'ON core_ingredient (user_id, lower(name))',
+            reverse_sql='DROP INDEX '
+                        'core_ingredient_user_normalized_name_uniq',
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.0.14 on 2026-10-16 19:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_CONFIG = 'pg_catalog.english'
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    On Postgres, fill the search vector of existing recipes, keep it in
+    sync with the title through a trigger and index it. When the pg_trgm
+    extension is available, also index the title for fuzzy matching.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"UPDATE core_recipe SET search_vector = "
+        f"to_tsvector('{SEARCH_CONFIG}', title)"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER core_recipe_search_vector_update "
+        f"BEFORE INSERT OR UPDATE OF title ON core_recipe FOR EACH ROW "
+        f"EXECUTE PROCEDURE tsvector_update_trigger("
+        f"search_vector, '{SEARCH_CONFIG}', title)"
+    )
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_search_vector_idx '
+        'ON core_recipe USING gin (search_vector)'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_title_trgm_idx '
+        'ON core_recipe USING gin (title gin_trgm_ops)'
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    """
+    Drop the trigger and indexes, leaving the pg_trgm extension in place
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_recipe_title_trgm_idx')
+    schema_editor.execute('DROP INDEX core_recipe_search_vector_idx')
+    schema_editor.execute(
+        'DROP TRIGGER core_recipe_search_vector_update ON core_recipe'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_unique_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
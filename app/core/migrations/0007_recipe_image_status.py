@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-16 19:17
+
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    """
+    Mark the images uploaded before processing was introduced as ready
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.exclude(image__isnull=True).exclude(image='').\
+        update(image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=10),
+        ),
+        migrations.RunPython(mark_existing_images_ready,
+                             migrations.RunPython.noop),
+    ]
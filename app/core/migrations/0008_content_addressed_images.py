@@ -0,0 +1,45 @@
+# Generated by Django 3.0.14 on 2026-10-16 19:22
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_references(apps, schema_editor):
+    """
+    Count the references to the images stored before content addressing
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    images = Recipe.objects.exclude(image__isnull=True).exclude(image='').\
+        values('image').annotate(references=Count('id')).order_by()
+    StoredFile.objects.bulk_create([
+        StoredFile(name=image['image'], references=image['references'])
+        for image in images
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(count_existing_references,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-16 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingredient_user_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='core_tag_user_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name', 'id'], name='core_ingredient_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name', 'id'], name='core_tag_keyset_idx'),
+        ),
+    ]
@@ -1,24 +1,32 @@
-import uuid
 import os
 
 from django.db import models
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 
+from core.storage import ContentAddressedStorage
+
 
 def recipe_image_file_path(instance, original_file_name):
     """
-    Generate new file path of recipe image
+    Generate new file path of recipe image. The storage replaces the
+    file name with the hash of the content, keeping the extension.
+    Uploads waiting for processing go to the private IMAGE_PROCESSING
+    ['RAW_DIR'].
     :param instance: recipe instance
     :param original_file_name: original file
            name of the file uploaded
     :return: new file path
     """
-    ext = original_file_name.split('.')[-1]
-    new_file_name = f'{uuid.uuid4()}.{ext}'
+    ext = original_file_name.split('.')[-1].lower()
+    directory = 'uploads/recipe/'
+    if instance is not None and \
+            instance.image_status == Recipe.IMAGE_PENDING:
+        directory = settings.IMAGE_PROCESSING['RAW_DIR']
 
-    return os.path.join('/uploads/recipe/', new_file_name)
+    return os.path.join(directory, f'image.{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -82,6 +90,12 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name', 'id'],
+                         name='core_tag_keyset_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -96,6 +110,12 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name', 'id'],
+                         name='core_ingredient_keyset_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name}'
 
@@ -104,6 +124,17 @@ class Recipe(models.Model):
     """
     Recipe class for creating recipe objects
     """
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -114,7 +145,29 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path,
+                              storage=ContentAddressedStorage())
+    image_status = models.CharField(max_length=10, blank=True,
+                                    choices=IMAGE_STATUS_CHOICES)
+    # Maintained by a database trigger on Postgres, see migration 0006
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title}'
+
+
+class StoredFile(models.Model):
+    """
+    Number of references to a file of the content addressed storage
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}'
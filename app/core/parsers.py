@@ -0,0 +1,37 @@
+import io
+
+from django.conf import settings
+
+from rest_framework.parsers import JSONParser
+
+from core.renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser decoding with orjson when it is installed. Bodies orjson
+    rejects, or that are not UTF-8, go through JSONParser, so errors
+    behave as before. orjson decodes integers beyond 64 bits as floats,
+    which integer fields reject as invalid.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parse the incoming bytestream as JSON
+        :param stream: request stream
+        :param media_type: content type of the request
+        :param parser_context: context of the view
+        :return: parsed data
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read() if stream is not None else b''
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type,
+                                 parser_context)
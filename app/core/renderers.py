@@ -0,0 +1,53 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer encoding with orjson when it is installed. orjson
+    handles datetimes and UUIDs natively; anything else, like Decimal or
+    lazy strings, goes through DRF's encoder, so the output is the same
+    as JSONRenderer's. Falls back to JSONRenderer without orjson, for
+    data orjson can not encode, and when pretty printing, ASCII output
+    or wide separators are requested.
+    """
+    orjson_options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+                      if orjson is not None else 0)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render data into JSON bytes
+        :param data: data to render
+        :param accepted_media_type: negotiated media type
+        :param renderer_context: context of the view
+        :return: bytes
+        """
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or \
+                not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=self.orjson_options
+            )
+        except TypeError as exc:
+            # Integers beyond 64 bits, which json encodes exactly
+            if str(exc) != 'Integer exceeds 64-bit range':
+                raise
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape U+2028 and U+2029 like JSONRenderer, so the output
+        # stays a strict javascript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').\
+                replace(b'\xe2\x80\xa9', b'\\u2029')
+
+        return ret
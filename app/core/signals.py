@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.models import Recipe
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """
+    Drop a token from the authentication cache when it is
+    regenerated or deleted
+    """
+    token_cache.invalidate(instance.key)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """
+    Drop the cached tokens of a user whenever the user changes, so that
+    deactivation and password changes take effect immediately
+    """
+    if kwargs.get('created'):
+        return
+    keys = Token.objects.filter(user_id=instance.pk).\
+        values_list('key', flat=True)
+    token_cache.invalidate_user(instance.pk, keys)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """
+    Release the reference of a deleted recipe to its image, removing
+    the file when no other recipe shares it
+    """
+    if instance.image:
+        instance.image.delete(save=False)
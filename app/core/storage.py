@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the SHA-256 of their content,
+    so identical files are stored once. Every save of a name counts as
+    a reference to it in StoredFile and every delete releases one; the
+    file is only removed with its last reference. The count row is
+    locked while a file is written or removed, so a file can not be
+    removed under a concurrent save of the same content. Files are
+    written under a temporary name next to their final one and renamed
+    into place, so a partially written file is never visible.
+    """
+
+    def get_content_name(self, name, content):
+        """
+        Return the content addressed name of a file, keeping the
+        directory and extension of the requested name
+        :param name: requested name
+        :param content: File object
+        :return: name
+        """
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+
+        return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        """
+        Store content under its content addressed name, writing it only
+        if no identical file is stored yet
+        :param name: requested name
+        :param content: file content
+        :param max_length: maximum length of the name
+        :return: stored name
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content).replace('\\', '/')
+
+        stored_file_model = apps.get_model('core', 'StoredFile')
+        with transaction.atomic():
+            stored_file, _ = stored_file_model.objects.select_for_update().\
+                get_or_create(name=name)
+            stored_file_model.objects.filter(pk=stored_file.pk).\
+                update(references=F('references') + 1)
+            if not self.exists(name):
+                self._save(name, content)
+
+        return name
+
+    def _save(self, name, content):
+        """
+        Write content to a temporary file in the target directory, then
+        rename it to its name. Uploads already in a temporary file are
+        moved there, which is a rename on the same file system.
+        :param name: content addressed name
+        :param content: File object
+        :return: name
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), temp_path,
+                               allow_overwrite=True)
+            else:
+                with os.fdopen(fd, 'wb') as file:
+                    for chunk in content.chunks():
+                        file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name
+
+    def delete(self, name):
+        """
+        Release a reference to a file, removing the file with the last
+        one. Files stored before reference counting are removed at once.
+        :param name: stored name
+        :return: None
+        """
+        stored_file_model = apps.get_model('core', 'StoredFile')
+        with transaction.atomic():
+            stored_file = stored_file_model.objects.select_for_update().\
+                filter(name=name).first()
+            if stored_file is not None and stored_file.references > 1:
+                stored_file_model.objects.filter(pk=stored_file.pk).\
+                    update(references=F('references') - 1)
+                return
+            if stored_file is not None:
+                stored_file.delete()
+            super().delete(name)
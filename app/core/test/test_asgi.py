@@ -0,0 +1,390 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+
+from core.asgi import BoundedASGIHandler
+from core.models import Recipe
+from core.storage import ContentAddressedStorage
+from recipe import export
+from recipe.images import image_queue
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+async def asgi_request(application, path, method='GET', headers=None,
+                       body=b''):
+    """
+    Send an HTTP request to an ASGI application
+    :param application: ASGI application
+    :param path: request path
+    :param method: request method
+    :param headers: dict of request headers
+    :param body: request body
+    :return: tuple of the status, headers and body of the response
+    """
+    headers = {'Host': 'testserver', 'Content-Length': str(len(body)),
+               **(headers or {})}
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'root_path': '',
+        'scheme': 'http',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in headers.items()],
+    }
+    requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    messages = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        return await asyncio.Future()
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+
+    return (messages[0]['status'], dict(messages[0]['headers']),
+            b''.join(message.get('body', b'') for message in messages[1:]))
+
+
+class ASGITestCase(TransactionTestCase):
+    """
+    Base class creating a user with a token. Views run on other threads,
+    so the data must be committed.
+    """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+
+    def run_requests(self, application, *requests):
+        """
+        Send requests concurrently to an application
+        :param application: ASGI application
+        :param requests: tuples of the asgi_request arguments after the
+        application
+        :return: list of responses
+        """
+        async def run():
+            return await asyncio.gather(*(
+                asgi_request(application, *request) for request in requests
+            ))
+
+        return asyncio.run(run())
+
+
+@override_settings(ASGI_THREADS={'WORKERS': 4, 'LIMITS': {
+    'recipe:recipe-list': 1,
+}})
+class BoundedASGIHandlerTest(ASGITestCase):
+    """
+    Test views run on the bounded thread pool within their limits
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.application = BoundedASGIHandler()
+
+    def tearDown(self) -> None:
+        self.application.executor.shutdown()
+
+    def count_concurrency(self, view):
+        """
+        Patch a view to take a while and record the most requests it
+        runs at once
+        :param view: dotted path of the view method
+        :return: tuple of the patcher and a dict with the maximum
+        """
+        counts = {'running': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def slow_view(viewset, request, *args, **kwargs):
+            with lock:
+                counts['running'] += 1
+                counts['max'] = max(counts['max'], counts['running'])
+            time.sleep(0.05)
+            with lock:
+                counts['running'] -= 1
+            return Response()
+
+        return patch(view, slow_view), counts
+
+    def test_views_run_on_pool(self):
+        """
+        Test the views run on the pool threads
+        :return: None
+        """
+        Recipe.objects.create(user=self.user, title='Curry',
+                              time_minutes=10, price=5)
+        threads = []
+        get_response = BoundedASGIHandler.get_response_sync
+
+        def record_thread(handler, request):
+            threads.append(threading.current_thread().name)
+            return get_response(handler, request)
+
+        with patch.object(BoundedASGIHandler, 'get_response_sync',
+                          record_thread):
+            [(status, _, body)] = self.run_requests(
+                self.application, (RECIPES_URL, 'GET', self.headers)
+            )
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'Curry', body)
+        self.assertTrue(threads[0].startswith('asgi-view'))
+
+    def test_limited_view_runs_within_limit(self):
+        """
+        Test a view with a limit never runs more requests than allowed,
+        while other views use the whole pool
+        :return: None
+        """
+        limited, limited_counts = self.count_concurrency(
+            'recipe.views.RecipeViewSet.list'
+        )
+        unlimited, unlimited_counts = self.count_concurrency(
+            'recipe.views.TagViewSet.list'
+        )
+        tags_url = reverse('recipe:tag-list')
+
+        with limited, unlimited:
+            responses = self.run_requests(
+                self.application,
+                *[(RECIPES_URL, 'GET', self.headers)] * 4,
+                *[(tags_url, 'GET', self.headers)] * 4
+            )
+
+        self.assertEqual([status for status, _, _ in responses], [200] * 8)
+        self.assertEqual(limited_counts['max'], 1)
+        self.assertGreater(unlimited_counts['max'], 1)
+
+    def test_streaming_response_iterated_on_pool(self):
+        """
+        Test streaming content querying the database is sent, which the
+        event loop thread is not allowed to do
+        :return: None
+        """
+        Recipe.objects.create(user=self.user, title='Curry',
+                              time_minutes=10, price=5)
+
+        [(status, _, body)] = self.run_requests(
+            self.application,
+            (EXPORT_URL, 'GET', self.headers)
+        )
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'Curry', body)
+
+    def test_streaming_view_thread_releases_connection(self):
+        """
+        Test the thread running a view returning a streaming response
+        releases its database connection, as another thread streams it
+        :return: None
+        """
+        calls = []
+
+        def record_close():
+            calls.append(threading.current_thread().name)
+            close_old_connections()
+
+        with patch('core.asgi.close_old_connections', record_close):
+            [(status, _, _)] = self.run_requests(
+                self.application, (EXPORT_URL, 'GET', self.headers)
+            )
+
+        self.assertEqual(status, 200)
+        # Before and after the view, and once streaming ends
+        self.assertEqual(len(calls), 3)
+
+    def test_export_under_load(self):
+        """
+        Test an export streamed while other requests take turns on the
+        pool is read on a single thread, keeping its server-side cursor
+        :return: None
+        """
+        for i in range(100):
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}',
+                                  time_minutes=10, price=5)
+        threads = set()
+        get_names = export._get_names
+
+        def slow_get_names(through, target, recipe_ids):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.002)
+            return get_names(through, target, recipe_ids)
+
+        with patch.object(RecipeViewSet, 'export_chunk_size', 5), \
+                patch.object(export, '_get_names', slow_get_names):
+            responses = self.run_requests(
+                self.application,
+                (EXPORT_URL, 'GET', self.headers),
+                *[(RECIPES_URL, 'GET', self.headers)] * 60
+            )
+
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        status, headers, body = responses[0]
+        self.assertEqual(len(body.splitlines()), 100)
+        self.assertEqual(len(threads), 1)
+
+    def test_streaming_response_closed_on_disconnect(self):
+        """
+        Test a stream stops and is closed when sending fails, releasing
+        its view limit
+        :return: None
+        """
+        closed = threading.Event()
+
+        def parts():
+            try:
+                while True:
+                    yield b'x' * 1024
+            finally:
+                closed.set()
+
+        response = StreamingHttpResponse(parts())
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                raise OSError('client gone')
+
+        async def run():
+            response.asgi_semaphore = asyncio.Semaphore(0)
+            with self.assertRaises(OSError):
+                await self.application.send_response(response, send)
+            return response.asgi_semaphore.locked()
+
+        self.assertFalse(asyncio.run(run()))
+        self.assertTrue(closed.is_set())
+
+
+def image_body(color):
+    """
+    Return the multipart body of an image upload
+    :param color: RGB color of the image, for distinct contents
+    :return: bytes
+    """
+    file = io.BytesIO()
+    Image.new('RGB', (20, 10), color=color).save(file, format='JPEG')
+    file.name = 'image.jpg'
+    file.seek(0)
+
+    return encode_multipart(BOUNDARY, {'image': file})
+
+
+def slow_save(save):
+    """
+    Return a storage save taking 50ms more, like a slow disk or network
+    storage would
+    :param save: original _save method
+    :return: function
+    """
+    def _save(storage, name, content):
+        time.sleep(0.05)
+        return save(storage, name, content)
+
+    return _save
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class ASGILoadTest(ASGITestCase):
+    """
+    Load test of concurrent image uploads with slow storage, with the
+    latency of a recipe list sent while they are in flight, against
+    Django's ASGI handler and the bounded one
+    """
+    uploads = 32
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings.enable()
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}',
+                                  time_minutes=10, price=5)
+            for i in range(self.uploads)
+        ]
+
+    def load(self, application, round_number):
+        """
+        Upload a new image to every recipe while listing the recipes
+        :param application: ASGI application
+        :param round_number: number of the round, for new images
+        :return: tuple of the upload duration and the list latency
+        """
+        headers = {**self.headers, 'Content-Type': MULTIPART_CONTENT}
+        list_latency = []
+
+        async def timed_list():
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            await asgi_request(application, RECIPES_URL, 'GET', self.headers)
+            list_latency.append(time.perf_counter() - start)
+
+        async def run():
+            return await asyncio.gather(timed_list(), *(
+                asgi_request(
+                    application,
+                    reverse('recipe:recipe-upload-image', args=[recipe.id]),
+                    'POST', headers, image_body((round_number, i, 0))
+                ) for i, recipe in enumerate(self.recipes)
+            ))
+
+        start = time.perf_counter()
+        responses = asyncio.run(run())[1:]
+        elapsed = time.perf_counter() - start
+        self.assertEqual({status for status, _, _ in responses}, {202})
+
+        return elapsed, list_latency[0]
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.media_root.cleanup()
+
+    @override_settings(ASGI_THREADS={'WORKERS': 16, 'LIMITS': {
+        'recipe:recipe-upload-image': 8,
+    }})
+    def test_benchmark_uploads(self):
+        with patch.object(image_queue, 'submit'), \
+                patch.object(ContentAddressedStorage, '_save',
+                             slow_save(ContentAddressedStorage._save)):
+            results = {
+                'ASGIHandler': self.load(ASGIHandler(), 0),
+                'BoundedASGIHandler': self.load(BoundedASGIHandler(), 1),
+            }
+
+        for name, (elapsed, latency) in results.items():
+            print(f'\n{name}: {self.uploads} uploads in {elapsed:.2f}s, '
+                  f'list latency {latency * 1000:.0f}ms')
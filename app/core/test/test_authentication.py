@@ -0,0 +1,188 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import CachedTokenAuthentication, token_cache
+
+
+def token_request(key):
+    """
+    Create a request carrying a token
+    :param key: token key
+    :return: request object
+    """
+    return APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key}')
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """
+    Test the cached token authentication backend
+    """
+
+    def setUp(self) -> None:
+        """
+        Setup a user with a token and an empty token cache
+        :return: None
+        """
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def tearDown(self) -> None:
+        token_cache.clear()
+
+    def test_second_request_skips_database(self):
+        """
+        Test the token is looked up in the database only once
+        :return: None
+        """
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate(
+                token_request(self.token.key)
+            )
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.authentication.authenticate(
+                token_request(self.token.key)
+            )
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(cached_user, self.user)
+        self.assertEqual(cached_token, self.token)
+        self.assertIsNot(cached_user, user)
+
+    def test_cached_instances_not_shared(self):
+        """
+        Test changes to the user of one request, including its state and
+        related caches, do not leak into the cached entry
+        :return: None
+        """
+        self.authentication.authenticate(token_request(self.token.key))
+        user, token = self.authentication.authenticate(
+            token_request(self.token.key)
+        )
+        user.name = 'Changed'
+        user._state.fields_cache['marker'] = True
+        user._prefetched_objects_cache = {'tags': []}
+
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.authentication.authenticate(
+                token_request(self.token.key)
+            )
+
+        self.assertIs(token.user, user)
+        self.assertIs(cached_token.user, cached_user)
+        self.assertNotEqual(cached_user.name, 'Changed')
+        self.assertNotIn('marker', cached_user._state.fields_cache)
+        self.assertFalse(hasattr(cached_user, '_prefetched_objects_cache'))
+        self.assertFalse(cached_user._state.adding)
+
+    def test_invalid_token_rejected(self):
+        """
+        Test an unknown token is not authenticated
+        :return: None
+        """
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(token_request('invalid'))
+
+    def test_deleted_token_invalidated(self):
+        """
+        Test a deleted token stops authenticating immediately
+        :return: None
+        """
+        self.authentication.authenticate(token_request(self.token.key))
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(token_request(self.token.key))
+
+    def test_inactive_user_invalidated(self):
+        """
+        Test deactivating a user stops its cached token authenticating
+        :return: None
+        """
+        self.authentication.authenticate(token_request(self.token.key))
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(token_request(self.token.key))
+
+    def test_password_change_invalidated(self):
+        """
+        Test changing the password reloads the user from the database
+        :return: None
+        """
+        self.authentication.authenticate(token_request(self.token.key))
+        self.user.set_password('newpass')
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            user, _ = self.authentication.authenticate(
+                token_request(self.token.key)
+            )
+
+        self.assertTrue(user.check_password('newpass'))
+
+    @patch('core.authentication.time.monotonic')
+    def test_entry_expires_after_ttl(self, monotonic):
+        """
+        Test cached entries are reloaded once the TTL has passed
+        :return: None
+        """
+        monotonic.return_value = 100
+        self.authentication.authenticate(token_request(self.token.key))
+        monotonic.return_value = 100 + token_cache.options['TTL'] + 1
+
+        with self.assertNumQueries(1):
+            self.authentication.authenticate(token_request(self.token.key))
+
+    @override_settings(TOKEN_AUTH_CACHE={
+        'MAX_SIZE': 1, 'TTL': 30, 'SHARED_CACHE': None
+    })
+    def test_least_recently_used_evicted(self):
+        """
+        Test the cache keeps at most MAX_SIZE entries
+        :return: None
+        """
+        user_two = get_user_model().objects.create_user(
+            email='test2@test.com',
+            password='testpass'
+        )
+        token_two = Token.objects.create(user=user_two)
+        self.authentication.authenticate(token_request(self.token.key))
+        self.authentication.authenticate(token_request(token_two.key))
+
+        with self.assertNumQueries(1):
+            self.authentication.authenticate(token_request(self.token.key))
+
+    @override_settings(TOKEN_AUTH_CACHE={
+        'MAX_SIZE': 100, 'TTL': 30, 'SHARED_CACHE': 'default'
+    })
+    def test_shared_cache_tier(self):
+        """
+        Test a process with an empty local cache reads the shared tier
+        and that invalidation clears the shared tier
+        :return: None
+        """
+        self.authentication.authenticate(token_request(self.token.key))
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(
+                token_request(self.token.key)
+            )
+        self.assertEqual(user, self.user)
+
+        self.token.delete()
+        token_cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(token_request(self.token.key))
@@ -1,28 +1,141 @@
-from unittest.mock import patch
+import unittest
+from io import StringIO
+from unittest.mock import call, patch
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+
+from core.management.commands.wait_for_db import Command
+
+
+class FakeClock:
+    """
+    Clock for time.monotonic advanced by time.sleep
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
 
 
 class CommandTests(TestCase):
 
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patchers = (patch('time.monotonic', self.clock.monotonic),
+                    patch('time.sleep', self.clock.sleep))
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_wait_for_db(self):
+        """
+        Test waiting for db, retrying with growing delays
+        :return: None
+        """
+        with patch.object(Command, 'ping') as ping:
+            ping.side_effect = [OperationalError] * 5 + [(0.002, 0.001)]
+            out = StringIO()
+            call_command('wait_for_db', stdout=out)
+
+        self.assertEqual(ping.call_count, 6)
+        self.assertEqual(len(self.clock.sleeps), 5)
+        for attempt, delay in enumerate(self.clock.sleeps):
+            self.assertGreaterEqual(delay, 0.1 * 2 ** attempt / 2)
+            self.assertLessEqual(delay, 0.1 * 2 ** attempt)
+        self.assertIn('connect 2.0ms, query 1.0ms, attempts 6',
+                      out.getvalue())
+
+    def test_wait_for_db_max_delay(self):
+        """
+        Test the delay between retries stops growing at the maximum
+        :return: None
+        """
+        with patch.object(Command, 'ping') as ping:
+            ping.side_effect = [OperationalError] * 10 + [(0, 0)]
+            call_command('wait_for_db', max_delay=1, stdout=StringIO())
+
+        self.assertLessEqual(max(self.clock.sleeps), 1)
+
+    def test_wait_for_db_timeout(self):
+        """
+        Test the command fails once the timeout has passed
+        :return: None
+        """
+        with patch.object(Command, 'ping') as ping:
+            ping.side_effect = OperationalError('connection refused')
+            with self.assertRaisesMessage(CommandError,
+                                          'connection refused'):
+                call_command('wait_for_db', timeout=10, stdout=StringIO())
+
+        self.assertAlmostEqual(sum(self.clock.sleeps), 10)
+
+    def test_wait_for_db_attempt_timeout(self):
+        """
+        Test every attempt is given the time left before the timeout
+        :return: None
+        """
+        with patch.object(Command, 'ping') as ping:
+            ping.side_effect = [OperationalError] * 2 + [(0, 0)]
+            call_command('wait_for_db', timeout=10, stdout=StringIO())
+
+        self.assertEqual(ping.call_args_list[0], call('default', 10))
+        self.assertAlmostEqual(ping.call_args_list[2][0][1],
+                               10 - sum(self.clock.sleeps))
+
+    def test_wait_for_databases(self):
+        """
+        Test every configured database is waited for by default, and
+        unknown aliases are refused
+        :return: None
+        """
+        with patch.object(Command, 'ping', return_value=(0, 0)) as ping:
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(ping.call_args_list, [call('default', 60)])
+
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', database=['replica'],
+                             stdout=StringIO())
+
+
+class CommandDatabaseTests(TransactionTestCase):
+
     def test_wait_for_db_ready(self):
         """
-        Test waiting for db when db is available
+        Test waiting for db when db is available runs a query on it
         :return: None
         """
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        out = StringIO()
+        with patch('time.sleep') as sleep:
+            call_command('wait_for_db', stdout=out)
 
-    @patch('time.sleep', return_value=True)
-    def test_wait_for_db(self, ts):
+        sleep.assert_not_called()
+        self.assertIn('Database default available! connect', out.getvalue())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql',
+                         'requires PostgreSQL')
+    def test_ping_connect_timeout(self):
         """
-        Test waiting for db
+        Test a connection attempt is bounded by the time left, and the
+        configured options are left as they were
         :return: None
         """
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        options = dict(connection.settings_dict['OPTIONS'])
+        with patch.object(connection, 'get_new_connection',
+                          side_effect=OperationalError('timeout expired')) \
+                as get_new_connection:
+            with self.assertRaises(OperationalError):
+                Command().ping('default', 2.5)
+
+        conn_params = get_new_connection.call_args[0][0]
+        self.assertEqual(conn_params['connect_timeout'], 3)
+        self.assertEqual(connection.settings_dict['OPTIONS'], options)
@@ -0,0 +1,128 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.health import readiness_cache
+
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthCheckTest(TestCase):
+    """
+    Test the liveness and readiness endpoints
+    """
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings.enable()
+        readiness_cache.clear()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.media_root.cleanup()
+
+    def test_healthz(self):
+        """
+        Test liveness is reported without touching the database
+        :return: None
+        """
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['status'], 'ok')
+        self.assertEqual(res['Cache-Control'], 'no-store')
+
+    def test_probes_skip_middleware(self):
+        """
+        Test probes are answered before the other middleware, so any
+        host is accepted and no middleware headers are added
+        :return: None
+        """
+        for url in (HEALTHZ_URL, READYZ_URL, HEALTHZ_URL + '/'):
+            res = self.client.get(url, HTTP_HOST='10.0.0.5')
+
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn('X-Frame-Options', res)
+
+    def test_readyz(self):
+        """
+        Test readiness checks the database, media volume and cache, with
+        the latency of each
+        :return: None
+        """
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(body['status'], 'ok')
+        self.assertEqual(set(body['checks']),
+                         {'database:default', 'media', 'cache:default'})
+        for result in body['checks'].values():
+            self.assertEqual(result['status'], 'ok')
+            self.assertGreaterEqual(result['latency_ms'], 0)
+        for stats in body['pools'].values():
+            self.assertGreaterEqual(stats['max_wait_time'], 0)
+        self.assertEqual(os.listdir(self.media_root.name), [])
+
+    def test_readyz_pool_stats(self):
+        """
+        Test readiness reports the connection pool statistics, current
+        even when the checks are cached
+        :return: None
+        """
+        self.client.get(READYZ_URL)
+        stats = {'default': {'max_size': 18, 'size': 3, 'waits': 2,
+                             'wait_time': 0.5, 'max_wait_time': 0.4}}
+
+        with patch('core.views.pool_stats', return_value=stats):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.json()['pools'], stats)
+
+    def test_readyz_failure(self):
+        """
+        Test a failing dependency makes the service unready
+        :return: None
+        """
+        with override_settings(
+                MEDIA_ROOT=os.path.join(self.media_root.name, 'missing')):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        body = res.json()
+        self.assertEqual(body['status'], 'error')
+        self.assertEqual(body['checks']['media']['status'], 'error')
+        self.assertIn('error', body['checks']['media'])
+        self.assertEqual(body['checks']['database:default']['status'], 'ok')
+
+    def test_readyz_cached(self):
+        """
+        Test probes within the cache interval reuse the last result
+        :return: None
+        """
+        self.client.get(READYZ_URL)
+
+        with patch('core.health.run_checks') as run_checks, \
+                self.assertNumQueries(0):
+            res = self.client.get(READYZ_URL)
+        run_checks.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+
+        with override_settings(HEALTH_CHECKS={'CACHE_SECONDS': -1}), \
+                self.assertNumQueries(1):
+            self.client.get(READYZ_URL)
+
+    def test_unsafe_methods_not_allowed(self):
+        """
+        Test probes only answer GET and HEAD
+        :return: None
+        """
+        self.assertEqual(self.client.post(READYZ_URL).status_code, 405)
+        self.assertEqual(self.client.head(HEALTHZ_URL).status_code, 200)
@@ -0,0 +1,171 @@
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.pagination import RecipeAttrPagination, RecipePagination
+
+
+class IndexUsageTest(TestCase):
+    """
+    Test the query planner uses the indexes matching the API access paths
+    """
+
+    def setUp(self) -> None:
+        """
+        Setup a few users owning tags, ingredients and recipes
+        :return: None
+        """
+        for i in range(3):
+            user = get_user_model().objects.create_user(
+                email=f'test{i}@test.com',
+                password='testpass'
+            )
+            tags = [Tag.objects.create(user=user, name=f'Tag {j}')
+                    for j in range(5)]
+            ingredients = [
+                Ingredient.objects.create(user=user, name=f'Ingredient {j}')
+                for j in range(5)
+            ]
+            for j in range(5):
+                recipe = Recipe.objects.create(
+                    user=user,
+                    title=f'Recipe {j}',
+                    time_minutes=10,
+                    price=5.00
+                )
+                recipe.tags.add(*tags[:j])
+                recipe.ingredients.add(*ingredients[:j])
+        self.user = user
+        self.tag = tags[0]
+        self.ingredient = ingredients[0]
+
+    def assertUsesIndex(self, queryset, index_name,
+                        disabled=('seqscan', 'bitmapscan', 'sort')):
+        """
+        Assert the plan of a queryset reads from an index.
+        Postgres prefers scanning and sorting tiny tables over an
+        ordered index scan, so those plans are disabled for the rest
+        of the test transaction.
+        :param queryset: queryset to explain
+        :param index_name: name of the expected index
+        :param disabled: plan methods to disable
+        :return: plan
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for method in disabled:
+                    cursor.execute(f'SET LOCAL enable_{method} = off')
+        plan = queryset.explain()
+
+        self.assertIn(index_name, plan)
+
+        return plan
+
+    def assertIndexRange(self, plan, column, operator):
+        """
+        Assert the index scan of a plan starts from a range on a column,
+        rather than filtering the rows it reads
+        :param plan: plan from assertUsesIndex
+        :param column: column name
+        :param operator: comparison operator
+        :return: None
+        """
+        if connection.vendor == 'postgresql':
+            pattern = rf'Index Cond: .*\b{column}\b\S* {operator} '
+        else:
+            pattern = rf'USING (COVERING )?INDEX .*\b{column}[<>]'
+        self.assertRegex(plan, pattern)
+
+    def test_tag_list_uses_keyset_index(self):
+        """
+        Test listing a user's tags by name uses the (user_id, name DESC,
+        id) index, on the first page and after a cursor
+        :return: None
+        """
+        queryset = Tag.objects.filter(user=self.user).order_by('-name', 'id')
+
+        self.assertUsesIndex(queryset, 'core_tag_keyset_idx')
+        plan = self.assertUsesIndex(
+            queryset.filter(RecipeAttrPagination()._rows_after(
+                [self.tag.name, self.tag.id]
+            )),
+            'core_tag_keyset_idx'
+        )
+        self.assertIndexRange(plan, 'name', '<=')
+
+    def test_ingredient_list_uses_keyset_index(self):
+        """
+        Test listing a user's ingredients by name uses the (user_id,
+        name DESC, id) index, on the first page and after a cursor
+        :return: None
+        """
+        queryset = Ingredient.objects.filter(user=self.user).\
+            order_by('-name', 'id')
+
+        self.assertUsesIndex(queryset, 'core_ingredient_keyset_idx')
+        plan = self.assertUsesIndex(
+            queryset.filter(RecipeAttrPagination()._rows_after(
+                [self.ingredient.name, self.ingredient.id]
+            )),
+            'core_ingredient_keyset_idx'
+        )
+        self.assertIndexRange(plan, 'name', '<=')
+
+    def test_recipe_list_uses_user_id_index(self):
+        """
+        Test listing a user's recipes uses the (user_id, id) index, on
+        the first page and after a cursor
+        :return: None
+        """
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        last = queryset[2]
+
+        self.assertUsesIndex(queryset, 'core_recipe_user_id_idx')
+        plan = self.assertUsesIndex(
+            queryset.filter(RecipePagination()._rows_after([last.id])),
+            'core_recipe_user_id_idx'
+        )
+        self.assertIndexRange(plan, 'id', '<')
+
+    def test_recipe_tags_by_tag_uses_reverse_index(self):
+        """
+        Test finding the recipes of a tag uses the (tag_id, recipe_id)
+        index of the through table
+        :return: None
+        """
+        queryset = Recipe.tags.through.objects.\
+            filter(tag_id=self.tag.id).values('recipe_id')
+
+        self.assertUsesIndex(queryset, 'core_recipe_tags_tag_recipe_idx')
+
+    def test_recipe_ingredients_by_ingredient_uses_reverse_index(self):
+        """
+        Test finding the recipes of an ingredient uses the
+        (ingredient_id, recipe_id) index of the through table
+        :return: None
+        """
+        queryset = Recipe.ingredients.through.objects.\
+            filter(ingredient_id=self.ingredient.id).values('recipe_id')
+
+        self.assertUsesIndex(
+            queryset,
+            'core_recipe_ingredients_ingredient_recipe_idx'
+        )
+
+    def test_recipe_search_uses_gin_index(self):
+        """
+        Test searching recipe titles uses the GIN index of the stored
+        search vector
+        :return: None
+        """
+        if connection.vendor != 'postgresql':
+            self.skipTest('full text search needs Postgres')
+        queryset = Recipe.objects.filter(
+            search_vector=SearchQuery('recipe', config='english')
+        )
+
+        # GIN indexes are only read through bitmap scans
+        self.assertUsesIndex(queryset, 'core_recipe_search_vector_idx',
+                             disabled=('seqscan',))
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.utils.http import http_date
+from django.views.static import serve
+
+from core.asgi import BoundedASGIHandler
+from core.views import serve_media, parse_range
+
+
+MEDIA_SERVING = {
+    'SENDFILE': None,
+    'PRIVATE_DIRS': ('private/',),
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 3600,
+    'BLOCK_SIZE': 64 * 1024,
+}
+
+
+class MediaTestCase(SimpleTestCase):
+    """
+    Base class creating a media root holding one file
+    """
+    content = bytes(range(256)) * 40
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.temp_dir.name,
+                                          MEDIA_SERVING=MEDIA_SERVING)
+        self.settings.enable()
+        os.makedirs(os.path.join(self.temp_dir.name, 'uploads'))
+        self.path = os.path.join(self.temp_dir.name, 'uploads', 'image.png')
+        with open(self.path, 'wb') as file:
+            file.write(self.content)
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.temp_dir.cleanup()
+
+
+class MediaViewTest(MediaTestCase):
+    """
+    Test serving media files
+    """
+
+    def get(self, path='uploads/image.png', **headers):
+        """
+        Request a media file
+        :param path: path relative to MEDIA_ROOT
+        :param headers: request headers in META format
+        :return: response object
+        """
+        return self.client.get(f'/media/{path}', **headers)
+
+    def test_serve_file(self):
+        """
+        Test a media file is streamed from its file with its headers
+        :return: None
+        """
+        res = self.get()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(int(res['Content-Length']), len(self.content))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(res['Last-Modified'],
+                         http_date(os.stat(self.path).st_mtime))
+
+    def test_missing_or_outside_files_not_found(self):
+        """
+        Test missing files, directories and paths leaving MEDIA_ROOT 404
+        :return: None
+        """
+        for path in ('uploads/missing.png', 'uploads', '../etc/passwd',
+                     'uploads/../../image.png'):
+            self.assertEqual(self.get(path).status_code, 404)
+
+    def test_private_files_not_found(self):
+        """
+        Test files in the private directories 404 however the path is
+        written, and only those
+        :return: None
+        """
+        os.makedirs(os.path.join(self.temp_dir.name, 'private', 'raw'))
+        shutil.copy(self.path,
+                    os.path.join(self.temp_dir.name, 'private', 'raw'))
+
+        for path in ('private/raw/image.png', '/private/raw/image.png',
+                     'uploads/../private/raw/image.png',
+                     './private//raw/image.png'):
+            self.assertEqual(self.get(path).status_code, 404)
+        os.rename(os.path.join(self.temp_dir.name, 'private'),
+                  os.path.join(self.temp_dir.name, 'privateer'))
+        self.assertEqual(self.get('privateer/raw/image.png').status_code,
+                         200)
+
+    def test_not_modified_since(self):
+        """
+        Test a client with a current copy gets 304
+        :return: None
+        """
+        mtime = os.stat(self.path).st_mtime
+
+        res = self.get(HTTP_IF_MODIFIED_SINCE=http_date(mtime))
+        self.assertEqual(res.status_code, 304)
+
+        res = self.get(HTTP_IF_MODIFIED_SINCE=http_date(mtime - 60))
+        self.assertEqual(res.status_code, 200)
+
+    def test_range(self):
+        """
+        Test a byte range is served partially
+        :return: None
+        """
+        res = self.get(HTTP_RANGE='bytes=100-299')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content),
+                         self.content[100:300])
+        self.assertEqual(res['Content-Length'], '200')
+        self.assertEqual(res['Content-Range'],
+                         f'bytes 100-299/{len(self.content)}')
+
+    def test_file_handed_to_wsgi_server(self):
+        """
+        Test the response exposes an open file positioned at the start
+        of the range, for wsgi.file_wrapper to send with os.sendfile
+        :return: None
+        """
+        request = RequestFactory().get('/media/uploads/image.png',
+                                       HTTP_RANGE='bytes=100-')
+
+        res = serve_media(request, 'uploads/image.png')
+
+        fd = res.file_to_stream.fileno()
+        self.assertEqual(os.lseek(fd, 0, os.SEEK_CUR), 100)
+        self.assertEqual(os.fstat(fd).st_ino, os.stat(self.path).st_ino)
+        res.close()
+
+    def test_open_and_suffix_ranges(self):
+        """
+        Test open ended and suffix ranges, clipped to the file size
+        :return: None
+        """
+        size = len(self.content)
+        for header, expected in (('bytes=10000-', self.content[10000:]),
+                                 ('bytes=-24', self.content[-24:]),
+                                 ('bytes=10230-99999', self.content[10230:]),
+                                 ('bytes=-99999', self.content)):
+            res = self.get(HTTP_RANGE=header)
+            self.assertEqual(res.status_code, 206)
+            self.assertEqual(b''.join(res.streaming_content), expected)
+        self.assertEqual(parse_range('bytes=0-0', size), (0, 0))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', size))
+        self.assertIsNone(parse_range('items=0-1', size))
+
+    def test_unsatisfiable_range(self):
+        """
+        Test a range past the end of the file is refused with 416
+        :return: None
+        """
+        res = self.get(HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'],
+                         f'bytes */{len(self.content)}')
+
+    def test_if_range(self):
+        """
+        Test a range is only served while If-Range matches the file
+        :return: None
+        """
+        mtime = os.stat(self.path).st_mtime
+
+        res = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(mtime))
+        self.assertEqual(res.status_code, 206)
+
+        res = self.get(HTTP_RANGE='bytes=0-9',
+                       HTTP_IF_RANGE=http_date(mtime - 60))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    def test_unsafe_methods_not_allowed(self):
+        """
+        Test media files can only be read
+        :return: None
+        """
+        res = self.client.post('/media/uploads/image.png')
+
+        self.assertEqual(res.status_code, 405)
+
+    def test_offload_to_proxy(self):
+        """
+        Test the sendfile modes leave sending the file to the proxy
+        :return: None
+        """
+        with override_settings(MEDIA_SERVING={
+                **MEDIA_SERVING, 'SENDFILE': 'x-accel-redirect'}):
+            res = self.get()
+        self.assertEqual(res['X-Accel-Redirect'],
+                         '/protected-media/uploads/image.png')
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['Content-Type'], 'image/png')
+
+        with override_settings(MEDIA_SERVING={
+                **MEDIA_SERVING, 'SENDFILE': 'x-sendfile'}):
+            res = self.get()
+        self.assertEqual(res['X-Sendfile'], self.path)
+        self.assertEqual(res.content, b'')
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class MediaViewBenchmark(MediaTestCase):
+    """
+    Compare the throughput of serve_media with django.views.static.serve,
+    sending the file to a local socket. Under ASGI the content of both
+    is iterated and written to the socket from Python; only offloading
+    to a front proxy, which sends the file with os.sendfile, avoids it.
+    """
+    rounds = 20
+
+    def setUp(self) -> None:
+        self.content = os.urandom(32 * 1024 * 1024)
+        super().setUp()
+        self.sender, receiver = socket.socketpair()
+        self.drain = threading.Thread(target=self.receive, args=(receiver,))
+        self.drain.start()
+
+    def tearDown(self) -> None:
+        self.sender.close()
+        self.drain.join()
+        super().tearDown()
+
+    def receive(self, receiver):
+        """
+        Read and discard everything sent until the socket is closed
+        :param receiver: socket
+        :return: None
+        """
+        buffer = bytearray(1024 * 1024)
+        with receiver:
+            while receiver.recv_into(buffer):
+                pass
+
+    def measure(self, send):
+        """
+        Return the throughput of a way of sending the media file
+        :param send: function sending the file for a request
+        :return: MB per second
+        """
+        request = RequestFactory().get('/media/uploads/image.png')
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            send(request)
+        elapsed = time.perf_counter() - start
+
+        return len(self.content) * self.rounds / elapsed / 1e6
+
+    def iterate(self, response):
+        """
+        Write the content of a response to the socket
+        :param response: streaming response
+        :return: None
+        """
+        for chunk in response.streaming_content:
+            self.sender.sendall(chunk)
+        response.close()
+
+    def send_asgi(self, application):
+        """
+        Request the media file from an ASGI application, writing the
+        body to the socket as it is sent
+        :param application: ASGI application
+        :return: None
+        """
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/media/uploads/image.png',
+            'query_string': b'',
+            'root_path': '',
+            'scheme': 'http',
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 50000),
+            'headers': [(b'host', b'testserver')],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                self.sender.sendall(message.get('body', b''))
+
+        asyncio.run(application(scope, receive, send))
+
+    def proxy_sendfile(self, response):
+        """
+        Send the file named by an X-Sendfile response to the socket with
+        os.sendfile, as the front proxy does
+        :param response: offload response
+        :return: None
+        """
+        with open(response['X-Sendfile'], 'rb') as file:
+            offset, size = 0, os.fstat(file.fileno()).st_size
+            while offset < size:
+                offset += os.sendfile(self.sender.fileno(), file.fileno(),
+                                      offset, size - offset)
+
+    def test_benchmark_throughput(self):
+        application = BoundedASGIHandler()
+        with override_settings(MEDIA_SERVING={**MEDIA_SERVING,
+                                              'SENDFILE': 'x-sendfile'}):
+            offloaded = self.measure(lambda request: self.proxy_sendfile(
+                serve_media(request, 'uploads/image.png')
+            ))
+        results = {
+            'static.serve': self.measure(lambda request: self.iterate(
+                serve(request, 'uploads/image.png',
+                      document_root=self.temp_dir.name)
+            )),
+            'serve_media': self.measure(lambda request: self.iterate(
+                serve_media(request, 'uploads/image.png')
+            )),
+            'serve_media under BoundedASGIHandler': self.measure(
+                lambda request: self.send_asgi(application)
+            ),
+            'serve_media offloaded to a sendfile proxy': offloaded,
+        }
+        application.executor.shutdown()
+
+        for name, throughput in results.items():
+            print(f'\n{name}: {throughput:.0f} MB/s')
@@ -1,7 +1,9 @@
+import hashlib
+import tempfile
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-
-from unittest.mock import patch
+from django.core.files.base import ContentFile
 
 from core import models
 
@@ -111,16 +113,23 @@ class ModelTest(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
-    @patch('uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
+    def test_recipe_file_name_content_hash(self):
         """
-        Test that the image is saved in the correct location
+        Test that the image is saved under the hash of its content
         :return: None
         """
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.recipe_image_file_path(None, 'myimage.jpg')
+        content = b'image content'
+        recipe = models.Recipe.objects.create(
+            user=sample_user(),
+            title='Steak and mushroom sauce',
+            time_minutes=5,
+            price=5.00
+        )
+        digest = hashlib.sha256(content).hexdigest()
 
-        exp_path = f'/uploads/recipe/{uuid}.jpg'
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root):
+            recipe.image.save('myimage.JPG', ContentFile(content))
 
-        self.assertEqual(file_path, exp_path)
+        exp_path = f'uploads/recipe/{digest[:2]}/{digest}.jpg'
+        self.assertEqual(recipe.image.name, exp_path)
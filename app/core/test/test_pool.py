@@ -0,0 +1,347 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from django.db import connection
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """
+    Stand-in for a DB-API connection
+    """
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    Test the connection pool bookkeeping
+    """
+
+    def setUp(self) -> None:
+        self.pool = ConnectionPool(max_size=2, max_age=60, timeout=0.05)
+
+    def checkout(self, check=lambda connection: True):
+        """
+        Check out a connection, opening a FakeConnection if needed
+        :param check: health check function
+        :return: connection
+        """
+        return self.pool.checkout(FakeConnection, check)
+
+    def test_connections_reused(self):
+        """
+        Test a returned connection is handed out again
+        :return: None
+        """
+        first = self.checkout()
+        self.pool.checkin(first)
+
+        self.assertIs(self.checkout(), first)
+        stats = self.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_full_pool_times_out(self):
+        """
+        Test checkouts beyond the maximum size wait, then fail
+        :return: None
+        """
+        self.checkout()
+        self.checkout()
+
+        with self.assertRaises(PoolTimeout):
+            self.checkout()
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        self.assertEqual(self.pool.size, 2)
+
+    def test_wait_for_returned_connection(self):
+        """
+        Test a waiting checkout gets a connection returned meanwhile and
+        the wait is recorded
+        :return: None
+        """
+        self.pool.timeout = 5
+        first = self.checkout()
+        self.checkout()
+        threading.Timer(0.05, self.pool.checkin, args=(first,)).start()
+
+        self.assertIs(self.checkout(), first)
+        stats = self.pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreaterEqual(stats['max_wait_time'], 0.04)
+        self.assertGreaterEqual(stats['wait_time'], stats['max_wait_time'])
+
+    def test_unhealthy_connection_replaced(self):
+        """
+        Test a connection failing its health check is closed and a new
+        one opened
+        :return: None
+        """
+        first = self.checkout()
+        self.pool.checkin(first)
+
+        second = self.checkout(check=lambda connection: False)
+
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_old_connections_recycled(self):
+        """
+        Test connections past their maximum age are closed, not reused
+        :return: None
+        """
+        first = self.checkout()
+        self.pool.checkin(first)
+        self.pool.max_age = 0
+        time.sleep(0.001)
+
+        second = self.checkout()
+        self.pool.checkin(second)
+
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(self.pool.stats()['recycled'], 2)
+        self.assertEqual(self.pool.size, 0)
+
+    def test_failed_connect_frees_room(self):
+        """
+        Test a connection that could not be opened does not count
+        :return: None
+        """
+        def connect():
+            raise OSError('refused')
+
+        with self.assertRaises(OSError):
+            self.pool.checkout(connect, lambda connection: True)
+
+        self.assertEqual(self.pool.size, 0)
+
+    def test_unreusable_connection_closed(self):
+        """
+        Test a connection returned dirty is closed
+        :return: None
+        """
+        first = self.checkout()
+        self.pool.checkin(first, reusable=False)
+
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+
+def pooled_connection(settings_dict):
+    """
+    Return a database connection outside of the project's connections.
+    It has the default alias, for which django.contrib.postgres already
+    looked up its type oids, and is told apart from the project's by an
+    application_name of its own on PostgreSQL.
+    :param settings_dict: database settings
+    :return: DatabaseWrapper object
+    """
+    return ConnectionHandler({'default': settings_dict})['default']
+
+
+class PooledBackendTestMixin:
+    """
+    Tests of a pooled database backend, against a database configured
+    by get_settings
+    """
+
+    def setUp(self) -> None:
+        self.connection = pooled_connection(self.get_settings())
+
+    def tearDown(self) -> None:
+        self.connection.close()
+        self.connection.pool.close()
+
+    def reconnect(self):
+        """
+        Close the connection and connect again
+        :return: DB-API connection
+        """
+        self.connection.close()
+        self.connection.ensure_connection()
+
+        return self.connection.connection
+
+    def test_connection_reused(self):
+        """
+        Test closing returns the connection to the pool for the next one
+        :return: None
+        """
+        self.connection.ensure_connection()
+        raw = self.connection.connection
+
+        self.assertIs(self.reconnect(), raw)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+        stats = self.connection.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_connection_closed_in_transaction_not_reused(self):
+        """
+        Test a connection closed inside a transaction is discarded
+        :return: None
+        """
+        self.connection.ensure_connection()
+        raw = self.connection.connection
+        self.connection.set_autocommit(False)
+
+        self.assertIsNot(self.reconnect(), raw)
+        self.assertEqual(self.connection.pool.stats()['discarded'], 1)
+
+    def test_pool_timeout(self):
+        """
+        Test a full pool raises a database error after its timeout
+        :return: None
+        """
+        self.connection.ensure_connection()
+        other = pooled_connection(self.get_settings())
+
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()
+
+
+class SQLitePooledBackendTest(PooledBackendTestMixin, SimpleTestCase):
+    """
+    Test the pooled SQLite backend
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        super().setUp()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.temp_dir.cleanup()
+
+    def get_settings(self):
+        """
+        Return the settings of a pooled SQLite database
+        :return: dict
+        """
+        return {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.path.join(self.temp_dir.name, 'db.sqlite3'),
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0.05},
+        }
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql',
+                     'requires PostgreSQL')
+class PostgresPooledBackendTest(PooledBackendTestMixin, TransactionTestCase):
+    """
+    Test the pooled PostgreSQL backend against the test database
+    """
+
+    def get_settings(self):
+        """
+        Return the settings of the test database with a pool
+        :return: dict
+        """
+        return {
+            **connection.settings_dict,
+            'ENGINE': 'core.db.backends.postgresql',
+            'OPTIONS': {'application_name': self.id()[-63:]},
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0.05},
+        }
+
+    def test_session_reset(self):
+        """
+        Test session settings do not leak to the next user
+        :return: None
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET statement_timeout = '1234ms'")
+
+        self.reconnect()
+
+        with self.connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            self.assertEqual(cursor.fetchone(), ('0',))
+
+    def test_connect_timeout_shares_pool(self):
+        """
+        Test connections opened with another connect_timeout, like the
+        attempts of wait_for_db, come from the same pool
+        :return: None
+        """
+        self.connection.ensure_connection()
+        raw = self.connection.connection
+        pool = self.connection.pool
+        self.connection.settings_dict['OPTIONS']['connect_timeout'] = 3
+
+        self.assertIs(self.reconnect(), raw)
+        self.assertIs(self.connection.pool, pool)
+
+    def test_terminated_connection_replaced(self):
+        """
+        Test a connection killed while idle fails its health check and
+        is replaced
+        :return: None
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            [pid] = cursor.fetchone()
+        self.connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            self.assertNotEqual(cursor.fetchone(), (pid,))
+        self.assertEqual(self.connection.pool.stats()['discarded'], 1)
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS') and
+                     connection.vendor == 'postgresql',
+                     'set RUN_BENCHMARKS=1 with PostgreSQL to run benchmarks')
+class PooledBackendBenchmark(TransactionTestCase):
+    """
+    Compare a request's connect, query and close with a new connection
+    each time and with the pooled backend
+    """
+    requests = 500
+
+    def measure(self, engine):
+        """
+        Return the mean time of a connection's request with an engine
+        :param engine: database backend
+        :return: milliseconds
+        """
+        database = pooled_connection({
+            **connection.settings_dict,
+            'ENGINE': engine,
+            'OPTIONS': {'application_name': 'benchmark'},
+        })
+        start = time.perf_counter()
+        for _ in range(self.requests):
+            with database.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            database.close()
+        elapsed = time.perf_counter() - start
+        if getattr(database, 'pool', None) is not None:
+            database.pool.close()
+
+        return elapsed / self.requests * 1000
+
+    def test_benchmark_request(self):
+        for engine in ('django.db.backends.postgresql',
+                       'core.db.backends.postgresql'):
+            print(f'\n{engine}: {self.measure(engine):.3f}ms per request')
@@ -0,0 +1,230 @@
+import datetime
+import io
+import os
+import time
+import unittest
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.fields import IntegerField
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+def sample_data():
+    """
+    Return data covering the types the API renders
+    :return: dict
+    """
+    return OrderedDict([
+        ('id', 1),
+        ('title', 'Crème brûlée   line'),
+        ('price', Decimal('5.50')),
+        ('price_string', '5.50'),
+        ('created', datetime.datetime(2020, 6, 7, 9, 35, 1, 123456,
+                                      tzinfo=timezone.utc)),
+        ('naive', datetime.datetime(2020, 6, 7, 9, 35)),
+        ('day', datetime.date(2020, 6, 7)),
+        ('duration', datetime.timedelta(minutes=90)),
+        ('uuid', uuid.UUID('12345678-1234-5678-1234-567812345678')),
+        ('label', gettext_lazy('Invalid cursor')),
+        ('tags', [1, 2, 3]),
+        ('nested', {'flag': True, 'empty': None, 2: 'int key'}),
+        ('ratio', 0.25),
+    ])
+
+
+def sample_recipes(count):
+    """
+    Return a list of recipe representations
+    :param count: number of recipes
+    :return: list of dicts
+    """
+    return [
+        OrderedDict([
+            ('id', i),
+            ('title', f'Recipe {i}'),
+            ('ingredients', [i, i + 1, i + 2]),
+            ('tags', [i, i + 1]),
+            ('time_minutes', i % 90),
+            ('price', Decimal(f'{i % 1000}.{i % 100:02d}')),
+            ('link', f'https://example.com/{i}'),
+        ])
+        for i in range(count)
+    ]
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    """
+    Test the fast renderer is output compatible with JSONRenderer
+    """
+
+    def test_output_identical(self):
+        """
+        Test the output matches JSONRenderer byte for byte
+        :return: None
+        """
+        data = sample_data()
+
+        self.assertEqual(FastJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_output_identical_without_orjson(self):
+        """
+        Test the renderer falls back to JSONRenderer without orjson
+        :return: None
+        """
+        data = sample_data()
+
+        with patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data),
+                             JSONRenderer().render(data))
+
+    def test_wide_integers(self):
+        """
+        Test integers beyond 64 bits render like JSONRenderer's
+        :return: None
+        """
+        for value in (2 ** 64, -2 ** 63 - 1, 10 ** 30):
+            data = {'id': value, 'tags': [value]}
+
+            self.assertEqual(FastJSONRenderer().render(data),
+                             JSONRenderer().render(data))
+
+    def test_unserializable_data_raises(self):
+        """
+        Test data neither orjson nor DRF's encoder handle still raises
+        :return: None
+        """
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({'value': object()})
+
+    def test_indent_requested(self):
+        """
+        Test pretty printing is still honoured
+        :return: None
+        """
+        data = sample_data()
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type)
+        )
+
+    def test_none_renders_empty(self):
+        """
+        Test rendering None gives an empty body
+        :return: None
+        """
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTest(SimpleTestCase):
+    """
+    Test the fast parser behaves like JSONParser
+    """
+
+    def parse(self, parser, body):
+        """
+        Parse a body with a parser
+        :param parser: parser object
+        :param body: bytes
+        :return: parsed data
+        """
+        return parser.parse(io.BytesIO(body), 'application/json', {})
+
+    def test_parse_identical(self):
+        """
+        Test parsing matches JSONParser, including 64 bit integers
+        :return: None
+        """
+        for body in (b'{"title": "Cr\\u00e8me", "tags": [1, 2]}',
+                     '[{"price": 5.5, "link": "ü"}]'.encode('utf-8'),
+                     b'{"big": 18446744073709551615, '
+                     b'"low": -9223372036854775808}'):
+            self.assertEqual(self.parse(FastJSONParser(), body),
+                             self.parse(JSONParser(), body))
+
+    def test_parse_huge_integer_rejected_by_integer_field(self):
+        """
+        Test integers beyond 64 bits are rejected by integer fields
+        rather than truncated
+        :return: None
+        """
+        data = self.parse(FastJSONParser(),
+                          b'{"time_minutes": 123456789012345678901234567890}')
+
+        with self.assertRaises(ValidationError):
+            IntegerField().run_validation(data['time_minutes'])
+
+    def test_parse_invalid(self):
+        """
+        Test invalid JSON and non standard constants are rejected
+        :return: None
+        """
+        for body in (b'{"title": ', b'{"ratio": NaN}'):
+            with self.assertRaises(ParseError):
+                self.parse(FastJSONParser(), body)
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class JSONRendererBenchmark(SimpleTestCase):
+    """
+    Benchmark the fast renderer and parser on large recipe lists
+    """
+
+    def time(self, func, repeat=5):
+        """
+        Return the best time of several runs
+        :param func: function to time
+        :param repeat: number of runs
+        :return: seconds
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
+
+    def test_render_and_parse_10k_recipes(self):
+        """
+        Time rendering and parsing 10k recipes
+        :return: None
+        """
+        data = {'next': None, 'results': sample_recipes(10000)}
+        body = JSONRenderer().render(data)
+
+        results = {
+            'render': (
+                self.time(lambda: JSONRenderer().render(data)),
+                self.time(lambda: FastJSONRenderer().render(data)),
+            ),
+            'parse': (
+                self.time(lambda: JSONParser().parse(
+                    io.BytesIO(body), 'application/json', {})),
+                self.time(lambda: FastJSONParser().parse(
+                    io.BytesIO(body), 'application/json', {})),
+            ),
+        }
+
+        for name, (default, fast) in results.items():
+            print(f'\n{name} 10k recipes: default {default * 1000:.1f}ms, '
+                  f'fast {fast * 1000:.1f}ms, speedup {default / fast:.1f}x')
+        if renderers.orjson is not None:
+            self.assertLess(results['render'][1], results['render'][0])
+            self.assertLess(results['parse'][1], results['parse'][0])
@@ -0,0 +1,111 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import TestCase, override_settings
+
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(TestCase):
+    """
+    Test the content addressed storage deduplicates and reference
+    counts files
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.temp_dir.name)
+        self.settings.enable()
+        self.storage = ContentAddressedStorage()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.temp_dir.cleanup()
+
+    def test_identical_content_stored_once(self):
+        """
+        Test saving the same content twice shares one file
+        :return: None
+        """
+        first = self.storage.save('uploads/a.png', ContentFile(b'image'))
+        second = self.storage.save('uploads/b.PNG', ContentFile(b'image'))
+        other = self.storage.save('uploads/c.png', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.endswith('.png'))
+        self.assertEqual(StoredFile.objects.get(name=first).references, 2)
+        self.assertEqual(len(os.listdir(os.path.join(
+            self.temp_dir.name, os.path.dirname(first)
+        ))), 1)
+
+    def test_file_removed_with_last_reference(self):
+        """
+        Test a shared file is only removed when released by every owner
+        :return: None
+        """
+        name = self.storage.save('uploads/a.png', ContentFile(b'image'))
+        self.storage.save('uploads/b.png', ContentFile(b'image'))
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_file_without_references_removed(self):
+        """
+        Test files stored before reference counting are removed at once
+        :return: None
+        """
+        path = os.path.join(self.temp_dir.name, 'legacy.png')
+        with open(path, 'wb') as file:
+            file.write(b'image')
+
+        self.storage.delete('legacy.png')
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_temporary_upload_moved_into_place(self):
+        """
+        Test an upload in a temporary file is moved, not copied
+        :return: None
+        """
+        upload = TemporaryUploadedFile('a.png', 'image/png', 5, None)
+        upload.write(b'image')
+        upload.seek(0)
+        temp_path = upload.temporary_file_path()
+
+        name = self.storage.save('uploads/a.png', upload)
+        upload.close()
+
+        self.assertFalse(os.path.exists(temp_path))
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image')
+
+    def test_failed_write_leaves_no_file(self):
+        """
+        Test a write failing halfway leaves neither the file nor its
+        temporary file behind
+        :return: None
+        """
+        content = ContentFile(b'image')
+        chunks = content.chunks
+
+        def failing_chunks(*args, **kwargs):
+            yield next(chunks(*args, **kwargs))
+            raise OSError('disk full')
+
+        with patch.object(content, 'chunks', failing_chunks):
+            with self.assertRaises(OSError):
+                self.storage._save('uploads/a.png', content)
+
+        self.assertEqual(
+            [files for _, _, files in os.walk(self.temp_dir.name) if files],
+            []
+        )
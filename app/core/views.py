@@ -0,0 +1,241 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, JsonResponse)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from core.db.pool import pool_stats
+from core.health import readiness_cache
+
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _FileRange:
+    """
+    File object reading a byte range of an open file. The underlying
+    file is positioned at the start of the range, so WSGI servers
+    sending it with os.sendfile through wsgi.file_wrapper start from
+    there and stop at the Content-Length of the response.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        """
+        Return the file descriptor of the underlying file
+        :return: file descriptor
+        """
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        """
+        Read up to size bytes, stopping at the end of the range
+        :param size: number of bytes, negative for the rest of the range
+        :return: bytes
+        """
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+
+        return data
+
+    def close(self):
+        """
+        Close the underlying file
+        :return: None
+        """
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the byte range requested by a Range header. Only single
+    ranges are supported, others are ignored and the whole file served.
+    :param header: value of the Range header
+    :param size: file size
+    :return: tuple of the first and last byte, None to serve the whole
+    file, or False when the range can not be satisfied
+    """
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range, the last n bytes
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        return False
+
+    return first, last
+
+
+def get_media_path(path):
+    """
+    Return the absolute path of a file under MEDIA_ROOT, outside of
+    MEDIA_SERVING['PRIVATE_DIRS']
+    :param path: path relative to MEDIA_ROOT
+    :return: path
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    for directory in settings.MEDIA_SERVING['PRIVATE_DIRS']:
+        directory = directory.strip('/')
+        if posixpath.commonpath([path, directory]) == directory:
+            raise Http404('Media file not found')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    return full_path
+
+
+def offload_response(full_path, content_type, mode):
+    """
+    Return an empty response telling the front proxy to send the file
+    :param full_path: absolute path of the file
+    :param content_type: content type of the file
+    :param mode: 'x-accel-redirect' or 'x-sendfile'
+    :return: HttpResponse object
+    """
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = settings.MEDIA_SERVING['ACCEL_PREFIX'].rstrip('/')
+        path = os.path.relpath(full_path, settings.MEDIA_ROOT)
+        response['X-Accel-Redirect'] = \
+            f"{prefix}/{quote(path.replace(os.sep, '/'))}"
+    else:
+        response['X-Sendfile'] = full_path
+
+    return response
+
+
+def file_response(request, full_path, stat, content_type):
+    """
+    Return a response streaming a file, or the byte range of it asked by
+    the Range header
+    :param request: request object
+    :param full_path: absolute path of the file
+    :param stat: stat result of the file
+    :param content_type: content type of the file
+    :return: response object
+    """
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and (
+            if_range is None or
+            parse_http_date_safe(if_range) == int(stat.st_mtime)):
+        byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        first, last = byte_range
+        response = FileResponse(
+            _FileRange(file, first, last - first + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    response.block_size = settings.MEDIA_SERVING['BLOCK_SIZE']
+    response['Accept-Ranges'] = 'bytes'
+
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file under MEDIA_ROOT, honouring If-Modified-Since and
+    single range requests. With MEDIA_SERVING['SENDFILE'] set, sending
+    the file is left to the front proxy, which uses sendfile. Otherwise
+    the file is streamed from an open file object: under ASGI it is read
+    in BLOCK_SIZE chunks on the view thread pool, only WSGI servers
+    supporting wsgi.file_wrapper send it with os.sendfile.
+    :param request: request object
+    :param path: path relative to MEDIA_ROOT
+    :return: response object
+    """
+    full_path = get_media_path(path)
+    stat = os.stat(full_path)
+    last_modified = http_date(stat.st_mtime)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    mode = settings.MEDIA_SERVING['SENDFILE']
+    if mode:
+        response = offload_response(full_path, content_type, mode)
+    else:
+        response = file_response(request, full_path, stat, content_type)
+    response['Last-Modified'] = last_modified
+    if encoding:
+        response['Content-Encoding'] = encoding
+    max_age = settings.MEDIA_SERVING['MAX_AGE']
+    if max_age is not None:
+        response['Cache-Control'] = f'max-age={max_age}'
+
+    return response
+
+
+@require_safe
+def healthz(request):
+    """
+    Report the process is alive, without touching any dependency
+    :param request: request object
+    :return: JsonResponse object
+    """
+    response = JsonResponse({'status': 'ok', 'checks': {}})
+    response['Cache-Control'] = 'no-store'
+
+    return response
+
+
+@require_safe
+def readyz(request):
+    """
+    Report whether the databases, media volume and caches work, with
+    the latency of each. Results are reused for a short while, their
+    age is returned in the Age header. The statistics of the database
+    connection pools, including checkout wait times, are always current.
+    :param request: request object
+    :return: JsonResponse object, with status 503 if a check failed
+    """
+    ready, results, age = readiness_cache.get()
+    response = JsonResponse(
+        {'status': 'ok' if ready else 'error', 'checks': results,
+         'pools': pool_stats()},
+        status=200 if ready else 503
+    )
+    response['Cache-Control'] = 'no-store'
+    response['Age'] = int(age)
+
+    return response
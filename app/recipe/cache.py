@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    """
+    Return the cache holding data versions and cached responses
+    :return: cache object
+    """
+    return caches[settings.RECIPE_CACHE['CACHE']]
+
+
+def _version_key(user_id):
+    """
+    Return the cache key of a user's data version
+    :param user_id: id of the user
+    :return: cache key
+    """
+    return f'recipe-data-version:{user_id}'
+
+
+def _initial_version():
+    """
+    Return a starting version. It is time based so that a counter lost
+    to eviction never restarts at a version that was already used.
+    :return: version number
+    """
+    return int(time.time() * 1000)
+
+
+def get_data_version(user_id):
+    """
+    Return the version of a user's recipe data
+    :param user_id: id of the user
+    :return: version number
+    """
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_data_version(user_id):
+    """
+    Move a user's recipe data to a new version, invalidating every
+    response and ETag issued for the previous one
+    :param user_id: id of the user
+    :return: None
+    """
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), _initial_version(), None)
+
+
+class ListResponseCache:
+    """
+    Cache of list payloads per user, keyed by the user's data version
+    so a single bump invalidates every cached page and filter variant
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, request):
+        """
+        Return the cache key of a list request
+        :param request: request object
+        :return: cache key
+        """
+        user_id = request.user.pk
+        url = hashlib.md5(
+            request.build_absolute_uri().encode('utf-8')
+        ).hexdigest()
+
+        return f'{self.prefix}:{user_id}:{get_data_version(user_id)}:{url}'
+
+    def get(self, key):
+        """
+        Return a cached payload, counting the hit or miss
+        :param key: cache key
+        :return: payload or None
+        """
+        data = get_cache().get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return data
+
+    def set(self, key, data):
+        """
+        Cache a payload
+        :param key: cache key
+        :param data: payload
+        :return: None
+        """
+        get_cache().set(key, data, settings.RECIPE_CACHE['TIMEOUT'])
+
+    def stats(self):
+        """
+        Return the hit and miss counters of this process
+        :return: dict of counters
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        """
+        Reset the hit and miss counters
+        :return: None
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
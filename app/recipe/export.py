@@ -0,0 +1,100 @@
+import csv
+from collections import defaultdict
+from itertools import islice
+
+from core.models import Recipe
+from core.renderers import FastJSONRenderer
+
+
+EXPORT_COLUMNS = ('id', 'title', 'time_minutes', 'price', 'link')
+EXPORT_FIELDS = EXPORT_COLUMNS + ('tags', 'ingredients')
+
+
+def _get_names(through, target, recipe_ids):
+    """
+    Return the related names of a chunk of recipes in one query
+    :param through: through model of the many to many field
+    :param target: name of the related field on the through model
+    :param recipe_ids: list of recipe ids
+    :return: dict of recipe id to list of names
+    """
+    names = defaultdict(list)
+    rows = through.objects.filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', f'{target}__name'
+    ).order_by('recipe_id', f'{target}__name')
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+
+    return names
+
+
+def iter_recipe_rows(queryset, chunk_size):
+    """
+    Yield the export rows of the recipes, reading them chunk by chunk
+    so that only one chunk is held in memory at a time. The tag and
+    ingredient names of each chunk are fetched with one query each.
+    :param queryset: recipe queryset
+    :param chunk_size: number of recipes per chunk
+    :return: generator of dicts
+    """
+    rows = queryset.values(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        recipe_ids = [row['id'] for row in chunk]
+        tags = _get_names(Recipe.tags.through, 'tag', recipe_ids)
+        ingredients = _get_names(
+            Recipe.ingredients.through, 'ingredient', recipe_ids
+        )
+        for row in chunk:
+            row['price'] = str(row['price'])
+            row['tags'] = tags.get(row['id'], [])
+            row['ingredients'] = ingredients.get(row['id'], [])
+            yield row
+
+
+def ndjson_lines(rows):
+    """
+    Encode rows as newline delimited JSON
+    :param rows: iterable of dicts
+    :return: generator of bytes
+    """
+    renderer = FastJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b'\n'
+
+
+class _Echo:
+    """
+    File-like object returning what is written, for csv.writer
+    """
+
+    def write(self, value):
+        """
+        Return the written value
+        :param value: string
+        :return: string
+        """
+        return value
+
+
+def csv_lines(rows):
+    """
+    Encode rows as CSV with a header line. Tag and ingredient names are
+    joined with semicolons.
+    :param rows: iterable of dicts
+    :return: generator of strings
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['tags'] = ';'.join(row['tags'])
+        row['ingredients'] = ';'.join(row['ingredients'])
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+    'csv': ('text/csv; charset=utf-8', csv_lines),
+}
@@ -0,0 +1,81 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class UserOwnedManyRelatedField(serializers.ManyRelatedField):
+    """
+    Many related field resolving every submitted id with a single query
+    and reporting all the missing ids together
+    """
+    default_error_messages = {
+        'does_not_exist': _('Invalid pks {pk_values} - '
+                            'objects do not exist.'),
+        'incorrect_type': _('Incorrect type. Expected pk value, '
+                            'received {data_type}.'),
+    }
+
+    def to_internal_value(self, data):
+        """
+        Return the objects of a list of ids
+        :param data: list of ids
+        :return: list of objects
+        """
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            if isinstance(item, bool):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                self.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(pks)
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+        if missing:
+            self.fail(
+                'does_not_exist',
+                pk_values=', '.join(str(pk) for pk in missing)
+            )
+
+        return [objects[pk] for pk in dict.fromkeys(pks)]
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field limited to objects owned by the requesting user
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        """
+        Build the many field validating all ids in one query
+        :return: UserOwnedManyRelatedField
+        """
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return UserOwnedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        """
+        Return the objects of the requesting user only
+        :return: queryset
+        """
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset.none()
+
+        return queryset.filter(user=request.user)
@@ -0,0 +1,101 @@
+from django.db.models import Count
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe
+
+
+class RelatedIdFilter:
+    """
+    Filter recipes by the ids of a many to many relation. In 'any' mode
+    a recipe matches when it has at least one of the ids, in 'all' mode
+    when it has every one of them. Both modes filter on a subquery of
+    the through table rather than joining it, so every recipe comes
+    back once and the rows read do not grow with the number of ids.
+    """
+    modes = ('any', 'all')
+    default_mode = 'any'
+    error_messages = {
+        'invalid_ids': _('Expected a comma separated list of ids.'),
+        'invalid_mode': _('Expected one of {modes}.'),
+    }
+
+    def __init__(self, param, through, column):
+        """
+        :param param: query parameter holding the ids
+        :param through: through model of the relation
+        :param column: column of the related id on the through model
+        """
+        self.param = param
+        self.mode_param = f'{param}_mode'
+        self.through = through
+        self.column = column
+
+    def get_ids(self, query_params):
+        """
+        Return the distinct ids requested
+        :param query_params: query parameters of the request
+        :return: list of ids, empty when not filtering
+        """
+        value = query_params.get(self.param)
+        if not value:
+            return []
+        try:
+            return list(dict.fromkeys(int(pk) for pk in value.split(',')))
+        except ValueError:
+            raise ValidationError(
+                {self.param: [self.error_messages['invalid_ids']]}
+            )
+
+    def get_mode(self, query_params):
+        """
+        Return the requested matching mode
+        :param query_params: query parameters of the request
+        :return: mode
+        """
+        mode = query_params.get(self.mode_param, self.default_mode)
+        if mode not in self.modes:
+            raise ValidationError({self.mode_param: [
+                self.error_messages['invalid_mode'].format(
+                    modes=', '.join(self.modes)
+                )
+            ]})
+
+        return mode
+
+    def get_recipe_ids(self, ids, mode):
+        """
+        Build the subquery of the ids of the matching recipes
+        :param ids: list of distinct related ids
+        :param mode: matching mode
+        :return: queryset of recipe ids
+        """
+        links = self.through.objects.filter(**{f'{self.column}__in': ids})
+        if mode == 'all' and len(ids) > 1:
+            links = links.values('recipe_id').annotate(
+                matched=Count(self.column, distinct=True)
+            ).filter(matched=len(ids))
+
+        return links.values('recipe_id')
+
+    def filter_queryset(self, queryset, query_params):
+        """
+        Return the recipes matching the requested ids
+        :param queryset: recipe queryset
+        :param query_params: query parameters of the request
+        :return: queryset
+        """
+        mode = self.get_mode(query_params)
+        ids = self.get_ids(query_params)
+        if not ids:
+            return queryset
+
+        return queryset.filter(id__in=self.get_recipe_ids(ids, mode))
+
+
+RECIPE_FILTERS = (
+    RelatedIdFilter('tags', Recipe.tags.through, 'tag_id'),
+    RelatedIdFilter('ingredients', Recipe.ingredients.through,
+                    'ingredient_id'),
+)
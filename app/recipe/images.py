@@ -0,0 +1,230 @@
+import io
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+from PIL import Image, ImageOps
+
+from core.models import Recipe, recipe_image_file_path
+from recipe.cache import bump_data_version
+
+
+logger = logging.getLogger(__name__)
+
+# Formats accepted from uploads, re-encoded in the same format
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+def read_image_header(file):
+    """
+    Read the format and dimensions of an image from its header, without
+    decoding any pixels, and check them against IMAGE_FORMATS and the
+    IMAGE_UPLOAD['MAX_PIXELS'] limit against decompression bombs
+    :param file: file object positioned at the start of the image
+    :return: tuple of the image format and size
+    """
+    max_pixels = settings.IMAGE_UPLOAD['MAX_PIXELS']
+    try:
+        with Image.open(file) as image:
+            image_format, size = image.format, image.size
+    except Image.DecompressionBombError:
+        raise ValueError('Image has too many pixels')
+    except (OSError, SyntaxError):
+        raise ValueError('File is not a valid image')
+    finally:
+        file.seek(0)
+
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f'Unsupported image format {image_format}')
+    if size[0] * size[1] > max_pixels:
+        raise ValueError(
+            f'Image of {size[0]}x{size[1]} pixels is over the limit of '
+            f'{max_pixels} pixels'
+        )
+
+    return image_format, size
+
+
+def reencode_image(file):
+    """
+    Decode and verify an image, apply its EXIF orientation and encode it
+    again, dropping any other metadata. The header is checked first so
+    that nothing over the pixel limit is decoded.
+    :param file: file object of the raw upload
+    :return: tuple of the encoded bytes and the image format
+    """
+    image_format, _ = read_image_header(file)
+    with Image.open(file) as image:
+        image.verify()
+    file.seek(0)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        output = io.BytesIO()
+        if image_format == 'JPEG':
+            image.save(output, format=image_format, quality=90)
+        else:
+            image.save(output, format=image_format)
+
+    return output.getvalue(), image_format
+
+
+def process_recipe_image(recipe_id, name):
+    """
+    Replace the raw upload of a recipe with the processed image, or mark
+    the image failed when it cannot be decoded. Nothing is changed if
+    the recipe got another image in the meantime.
+    :param recipe_id: id of the recipe
+    :param name: storage name of the raw upload
+    :return: None
+    """
+    storage = Recipe._meta.get_field('image').storage
+    recipes = Recipe.objects.filter(id=recipe_id, image=name)
+    user_id = recipes.values_list('user_id', flat=True).first()
+    if user_id is None:
+        return
+    # Queryset updates send no signals, bump the version for the ETags
+    recipes.update(image_status=Recipe.IMAGE_PROCESSING)
+    bump_data_version(user_id)
+
+    try:
+        with storage.open(name) as file:
+            data, image_format = reencode_image(file)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        logger.info('Recipe %s image %s failed processing', recipe_id, name)
+        # Otherwise the reference was released with the recipe or image
+        if recipes.update(image=None, image_status=Recipe.IMAGE_FAILED):
+            bump_data_version(user_id)
+            storage.delete(name)
+        return
+
+    processed = storage.save(
+        recipe_image_file_path(None, f'image.{image_format.lower()}'),
+        ContentFile(data)
+    )
+    if recipes.update(image=processed, image_status=Recipe.IMAGE_READY):
+        bump_data_version(user_id)
+        storage.delete(name)
+    else:
+        storage.delete(processed)
+
+
+class ImageProcessingQueue:
+    """
+    Bounded queue of recipe images waiting for processing, drained by a
+    fixed number of worker threads started on first use. Pillow releases
+    the GIL while decoding and encoding, so threads run them in parallel.
+    The queue lives in memory only; recipes record their image status,
+    from which requeue recovers the jobs of a stopped process.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._lock = threading.Lock()
+
+    @property
+    def options(self):
+        """
+        Return the IMAGE_PROCESSING settings
+        :return: dict of options
+        """
+        return settings.IMAGE_PROCESSING
+
+    def _start(self):
+        """
+        Create the queue and start the workers if not already running
+        :return: queue
+        """
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(self.options['QUEUE_SIZE'])
+                for i in range(self.options['WORKERS']):
+                    threading.Thread(
+                        target=self._work,
+                        name=f'recipe-image-{i}',
+                        daemon=True
+                    ).start()
+
+        return self._queue
+
+    def _work(self):
+        """
+        Process queued images forever
+        :return: None
+        """
+        while True:
+            recipe_id, name = self._queue.get()
+            try:
+                process_recipe_image(recipe_id, name)
+            except Exception:
+                logger.exception('Recipe %s image %s processing error',
+                                 recipe_id, name)
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+    def requeue(self):
+        """
+        Queue the images of the recipes left pending or processing, whose
+        jobs were lost with the queue of a stopped process. Processing an
+        image twice is harmless: the run finding the recipe image already
+        replaced changes nothing.
+        :return: number of images queued
+        """
+        recipes = Recipe.objects.filter(
+            image_status__in=(Recipe.IMAGE_PENDING, Recipe.IMAGE_PROCESSING)
+        ).exclude(image='').order_by('id')
+        jobs = list(recipes.values_list('id', 'image'))
+        for recipe_id, name in jobs:
+            self.submit(recipe_id, name)
+
+        return len(jobs)
+
+    def requeue_in_background(self):
+        """
+        Requeue the unfinished images from a thread, so that a process
+        starting with more than QUEUE_SIZE of them is not held up
+        :return: None
+        """
+        def requeue():
+            try:
+                count = self.requeue()
+                if count:
+                    logger.info('Requeued %s recipe images', count)
+            except Exception:
+                logger.exception('Recipe images could not be requeued')
+            finally:
+                close_old_connections()
+
+        threading.Thread(target=requeue, name='recipe-image-requeue',
+                         daemon=True).start()
+
+    def full(self):
+        """
+        Return whether no more images can be queued
+        :return: bool
+        """
+        return self._start().full()
+
+    def submit(self, recipe_id, name):
+        """
+        Queue the processing of an uploaded image, waiting for room when
+        the queue is full
+        :param recipe_id: id of the recipe
+        :param name: storage name of the raw upload
+        :return: None
+        """
+        self._start().put((recipe_id, name))
+
+    def join(self):
+        """
+        Wait until every queued image is processed
+        :return: None
+        """
+        self._start().join()
+
+
+image_queue = ImageProcessingQueue()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipe.images import image_queue
+
+
+class Command(BaseCommand):
+    """
+    Django command to process the recipe images left pending or
+    processing, e.g. by a restart losing the in-memory queue
+    """
+    help = 'Process the recipe images whose processing never finished'
+
+    def handle(self, *args, **options):
+        count = image_queue.requeue()
+        image_queue.join()
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {count} recipe images'
+        ))
@@ -0,0 +1,91 @@
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipe.cache import get_data_version
+
+
+class ConditionalGetMixin:
+    """
+    Answer reads with 304 Not Modified, before any query or serializer
+    work, when the client already holds the current representation
+    """
+
+    def get_etag(self, request):
+        """
+        Build the ETag of a request from the user's data version, so no
+        rows are read to compute it. The url and accepted media type
+        tell apart the representations sharing a version.
+        :param request: request object
+        :return: quoted ETag
+        """
+        user_id = request.user.pk
+        representation = hashlib.md5(
+            f'{request.get_full_path()}|{request.accepted_media_type}'.
+            encode('utf-8')
+        ).hexdigest()
+
+        return quote_etag(
+            f'{user_id}-{get_data_version(user_id)}-{representation}'
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Run a handler unless the request's If-None-Match matches. A
+        wildcard only matches once the object of a detail request is
+        found, so missing or foreign objects still answer 404.
+        :param handler: view handler to run on a mismatch
+        :param request: request object
+        :return: Response object
+        """
+        etag = self.get_etag(request)
+        if_none_match = [
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        ]
+        if '*' in if_none_match and etag not in if_none_match and \
+                getattr(self, 'detail', False):
+            self.get_object()
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+
+        return response
+
+
+class FastListMixin:
+    """
+    List through the serializer's fast representation, reading
+    .values() rows instead of model instances
+    """
+
+    def fast_list(self, request, *args, **kwargs):
+        """
+        Return the list built by the fast representation
+        :param request: request object
+        :return: Response object
+        """
+        serializer_class = self.get_serializer_class()
+        columns = serializer_class.get_fast_columns()
+        ordering = [field.lstrip('-')
+                    for field in getattr(self.paginator, 'ordering', ())]
+        queryset = self.filter_queryset(self.get_queryset()).\
+            prefetch_related(None).values(*dict.fromkeys(columns + ordering))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer_class.fast_representation(page)
+            )
+
+        return Response(serializer_class.fast_representation(list(queryset)))
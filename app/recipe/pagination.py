@@ -0,0 +1,214 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the values of every ordering column.
+    Pages are fetched with a WHERE clause on the last row seen instead
+    of an OFFSET, and no COUNT(*) is run, so every page costs the same.
+    """
+    ordering = ('-id',)
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of objects following the requested cursor
+        :param queryset: queryset to paginate
+        :param request: request object
+        :param view: view being paginated
+        :return: list of objects
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            position = self._parse_position(queryset, position)
+            queryset = queryset.filter(self._rows_after(position))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            self.next_position = self._get_position(page[-1])
+
+        return page
+
+    def get_paginated_response(self, data):
+        """
+        Wrap the serialized page with the link to the next page
+        :param data: serialized page
+        :return: Response object
+        """
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        """
+        Return the page size requested by the client, within limits
+        :param request: request object
+        :return: page size
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        """
+        Return the url of the next page
+        :return: url or None on the last page
+        """
+        if not self.has_next:
+            return None
+
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def decode_cursor(self, request):
+        """
+        Return the ordering values encoded in the request cursor
+        :param request: request object
+        :return: list of values or None for the first page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+            )
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def encode_cursor(self, position):
+        """
+        Encode ordering values into an opaque cursor
+        :param position: list of values
+        :return: cursor string
+        """
+        data = json.dumps(position, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def _get_position(self, obj):
+        """
+        Return the ordering values of an object
+        :param obj: model instance or .values() row
+        :return: list of values
+        """
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(obj, dict):
+            return [obj[name] for name in names]
+
+        return [getattr(obj, name) for name in names]
+
+    def _get_field(self, queryset, name):
+        """
+        Return the field of an ordering column, a model field or an
+        annotation of the queryset
+        :param queryset: queryset being paginated
+        :param name: column name
+        :return: Field object
+        """
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+
+        return queryset.model._meta.get_field(name)
+
+    def _parse_position(self, queryset, position):
+        """
+        Convert decoded cursor values to the types of their columns
+        :param queryset: queryset being paginated
+        :param position: list of values decoded from the cursor
+        :return: list of values
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (dict, list)):
+                raise NotFound(self.invalid_cursor_message)
+            field = self._get_field(queryset, field.lstrip('-'))
+            try:
+                values.append(field.to_python(value))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+    def _rows_after(self, position):
+        """
+        Build the condition selecting rows ordered after a position, led
+        by a range on the first column that an index on the ordering can
+        serve, e.g. (-a, b) after (1, 2) becomes
+        a <= 1 AND (a < 1 OR b > 2)
+        :param position: list of ordering values
+        :return: Q object
+        """
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, position))):
+            name = field.lstrip('-')
+            strict, inclusive = ('lt', 'lte') if field.startswith('-') \
+                else ('gt', 'gte')
+            term = Q(**{f'{name}__{strict}': value})
+            if condition is not None:
+                term = Q(**{f'{name}__{inclusive}': value}) & \
+                    (term | condition)
+            condition = term
+
+        return condition
+
+
+class RecipePagination(KeysetPagination):
+    """
+    Paginate recipes newest first along the (user_id, id) index, the
+    queryset being filtered on the user
+    """
+    ordering = ('-id',)
+
+
+class RecipeAttrPagination(KeysetPagination):
+    """
+    Paginate tags and ingredients in the API order of name descending,
+    with the id breaking ties between equal names, along the
+    (user_id, name DESC, id) index
+    """
+    ordering = ('-name', 'id')
+
+
+class RecipeSearchPagination(KeysetPagination):
+    """
+    Paginate search results most relevant first
+    """
+    ordering = ('-rank', '-id')
@@ -0,0 +1,211 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+
+from PIL import Image
+
+from recipe.cache import get_cache
+
+
+RENDITION_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+CONTENT_NAME = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(?:\.[^/.]*)?$'
+)
+
+
+def get_source_hash(image):
+    """
+    Return the SHA-256 of an image file. Content addressed names carry
+    it, so only other names read the file, once per name, since stored
+    images are never rewritten in place.
+    :param image: FieldFile of the image
+    :return: hex digest
+    """
+    match = CONTENT_NAME.search(image.name)
+    if match is not None:
+        return match.group(2)
+
+    key = f'recipe-image-hash:{image.name}'
+    digest = get_cache().get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with image.storage.open(image.name) as file:
+            for chunk in file.chunks():
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        get_cache().set(key, digest, None)
+
+    return digest
+
+
+def render_image(file, width, rendition_format, quality):
+    """
+    Resize an image to a width, never upscaling, and encode it
+    :param file: file object of the source image
+    :param width: maximum width in pixels
+    :param rendition_format: key of RENDITION_FORMATS
+    :param quality: encoder quality from 1 to 100
+    :return: encoded bytes
+    """
+    pil_format = RENDITION_FORMATS[rendition_format][0]
+    with Image.open(file) as image:
+        height = max(1, round(image.height * width / image.width))
+        # Lets the JPEG decoder skip to a reduced scale
+        image.draft('RGB', (width, height))
+        image.thumbnail((width, height), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        if pil_format == 'PNG':
+            image.save(output, format=pil_format, optimize=True)
+        else:
+            image.save(output, format=pil_format, quality=quality)
+
+    return output.getvalue()
+
+
+class RenditionCache:
+    """
+    Disk cache of image renditions keyed by the source content hash and
+    the rendition parameters. Reads refresh a file's modification time
+    and, once the files exceed MAX_BYTES, the least recently used are
+    deleted until they are back under LOW_WATER of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size = None
+
+    @property
+    def options(self):
+        """
+        Return the IMAGE_RENDITIONS settings
+        :return: dict of options
+        """
+        return settings.IMAGE_RENDITIONS
+
+    def get_key(self, source_hash, width, rendition_format, quality):
+        """
+        Return the cache key of a rendition
+        :param source_hash: content hash of the source image
+        :param width: width of the rendition
+        :param rendition_format: format of the rendition
+        :param quality: encoder quality
+        :return: cache key
+        """
+        return f'{source_hash}-{width}-{quality}.{rendition_format}'
+
+    def get_path(self, key):
+        """
+        Return the file path of a cache key
+        :param key: cache key
+        :return: path
+        """
+        return os.path.join(self.options['ROOT'], key[:2], key)
+
+    def open(self, key):
+        """
+        Open a cached rendition, marking it recently used
+        :param key: cache key
+        :return: file object or None on a miss
+        """
+        path = self.get_path(key)
+        try:
+            os.utime(path)
+            return open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, data):
+        """
+        Store a rendition, evicting old ones when over the size limit
+        :param key: cache key
+        :param data: encoded bytes
+        :return: None
+        """
+        path = self.get_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.options['MAX_BYTES']:
+                self._size = self._evict()
+
+    def _list_files(self):
+        """
+        Return the cached renditions, skipping those still being written
+        :return: list of (modification time, size, path)
+        """
+        files = []
+        for directory, _, names in os.walk(self.options['ROOT']):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        return files
+
+    def _scan_size(self):
+        """
+        Return the total size of the cached renditions
+        :return: bytes
+        """
+        return sum(size for _, size, _ in self._list_files())
+
+    def _evict(self):
+        """
+        Delete the least recently used renditions until under the low
+        water mark. The sizes are read from disk so that renditions
+        written by other processes are accounted for.
+        :return: remaining bytes
+        """
+        files = sorted(self._list_files())
+        size = sum(file_size for _, file_size, _ in files)
+        target = self.options['MAX_BYTES'] * self.options['LOW_WATER']
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+        return size
+
+    def clear(self):
+        """
+        Delete every cached rendition
+        :return: None
+        """
+        with self._lock:
+            for _, _, path in self._list_files():
+                os.remove(path)
+            self._size = 0
+
+
+rendition_cache = RenditionCache()
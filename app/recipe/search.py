@@ -0,0 +1,95 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+
+SEARCH_CONFIG = 'english'
+
+_trigram_available = {}
+
+
+class TitleSearchRank(SearchRank):
+    """
+    ts_rank divided by the length of the title, so that short titles
+    naming the term rank above long ones repeating it
+    """
+    template = '%(function)s(%(expressions)s, 2)'
+
+
+def has_trigram(connection):
+    """
+    Return whether the pg_trgm extension is installed in the database
+    :param connection: database connection
+    :return: bool
+    """
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            _trigram_available[key] = cursor.fetchone() is not None
+
+    return _trigram_available[key]
+
+
+def _postgres_search(queryset, term, connection):
+    """
+    Match the stored search vector of the titles and, when pg_trgm is
+    installed, titles similar to the term, so misspellings still match.
+    Both conditions are served by GIN indexes.
+    :param queryset: recipe queryset
+    :param term: search term
+    :param connection: database connection
+    :return: queryset annotated with rank
+    """
+    query = SearchQuery(term, config=SEARCH_CONFIG)
+    condition = Q(search_vector=query)
+    rank = TitleSearchRank(F('search_vector'), query)
+    if has_trigram(connection):
+        condition |= Q(title__trigram_similar=term)
+        rank = rank + TrigramSimilarity('title', term)
+
+    # ts_rank returns a real, cast so the rank survives a round trip
+    # through pagination cursors unchanged
+    return queryset.filter(condition).annotate(
+        rank=Cast(rank, FloatField())
+    )
+
+
+def _fallback_search(queryset, term):
+    """
+    Match titles containing every word of the term, ranking exact and
+    prefix matches first. Used on databases without full text search.
+    :param queryset: recipe queryset
+    :param term: search term
+    :return: queryset annotated with rank
+    """
+    condition = Q()
+    for word in term.split():
+        condition &= Q(title__icontains=word)
+    rank = Case(
+        When(title__iexact=term, then=Value(1.0)),
+        When(title__istartswith=term, then=Value(0.5)),
+        default=Value(0.1),
+        output_field=FloatField()
+    )
+
+    return queryset.filter(condition).annotate(rank=rank)
+
+
+def search_recipes(queryset, term):
+    """
+    Return the recipes whose title matches a search term, annotated
+    with a rank where higher is more relevant
+    :param queryset: recipe queryset
+    :param term: search term
+    :return: queryset
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, term, connection)
+
+    return _fallback_search(queryset, term)
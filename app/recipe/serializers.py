@@ -1,9 +1,156 @@
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, transaction
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
 
 from core.models import Tag, Ingredient, Recipe
 
+from recipe.cache import bump_data_version
+from recipe.fields import (UserOwnedManyRelatedField,
+                           UserOwnedPrimaryKeyRelatedField)
+from recipe.images import read_image_header
+from recipe.renditions import RENDITION_FORMATS
+
+
+class FastRepresentationMixin:
+    """
+    Opt-in read-only path building the representation of many objects
+    from .values() rows and many to many ids grouped in one query per
+    field, skipping the field by field work of to_representation.
+    The output is identical to serializing the instances.
+    """
+    passthrough_field_classes = (serializers.IntegerField,
+                                 serializers.CharField)
+
+    @classmethod
+    def _get_fast_fields(cls):
+        """
+        Split the readable fields into columns and many to many ids
+        :return: list of (field, is_many) in output order
+        """
+        fields = []
+        for field in cls()._readable_fields:
+            if isinstance(field, serializers.ManyRelatedField) and \
+                    isinstance(field.child_relation,
+                               serializers.PrimaryKeyRelatedField):
+                fields.append((field, True))
+            elif isinstance(field, (serializers.BaseSerializer,
+                                    serializers.RelatedField,
+                                    serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(
+                    f'{cls.__name__}.{field.field_name} is not supported '
+                    f'by the fast representation'
+                )
+            else:
+                fields.append((field, False))
+
+        return fields
 
-class TagSerializer(serializers.ModelSerializer):
+    @classmethod
+    def get_fast_columns(cls):
+        """
+        Return the columns to select with .values()
+        :return: list of column names
+        """
+        return [field.source for field, is_many in cls._get_fast_fields()
+                if not is_many]
+
+    @classmethod
+    def fast_representation(cls, rows):
+        """
+        Return the representation of .values() rows
+        :param rows: list of dicts holding get_fast_columns()
+        :return: list of dicts
+        """
+        model = cls.Meta.model
+        fields = cls._get_fast_fields()
+        ids = [row['id'] for row in rows]
+
+        related_ids = {}
+        for field, is_many in fields:
+            if not is_many:
+                continue
+            model_field = model._meta.get_field(field.source)
+            through = model_field.remote_field.through
+            source = f'{model_field.m2m_field_name()}_id'
+            target = f'{model_field.m2m_reverse_field_name()}_id'
+            grouped = defaultdict(list)
+            for source_id, target_id in through.objects.filter(
+                    **{f'{source}__in': ids}
+            ).order_by(source, target).values_list(source, target):
+                grouped[source_id].append(target_id)
+            related_ids[field.field_name] = grouped
+
+        converters = []
+        for field, is_many in fields:
+            convert = None
+            if not is_many and \
+                    not isinstance(field, cls.passthrough_field_classes):
+                convert = field.to_representation
+            converters.append((field.field_name, field.source, convert,
+                               is_many))
+
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for name, source, convert, is_many in converters:
+                if is_many:
+                    item[name] = related_ids[name].get(row['id'], [])
+                    continue
+                value = row[source]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+
+        return data
+
+
+class RecipeAttrSerializer(FastRepresentationMixin,
+                           serializers.ModelSerializer):
+    """
+    Base serializer for user owned recipe attributes, whose names are
+    unique per user regardless of case
+    """
+
+    def validate_name(self, value):
+        """
+        Reject a name the user already has
+        :param value: name
+        :return: name
+        """
+        request = self.context.get('request')
+        if self.instance is None and request is not None:
+            normalized = Lower(models.Value(value, models.CharField()))
+            exists = self.Meta.model.objects.annotate(
+                normalized=Lower('name')
+            ).filter(user=request.user, normalized=normalized).exists()
+            if exists:
+                raise serializers.ValidationError(
+                    _('You already have an entry with this name.'),
+                    code='unique'
+                )
+
+        return value
+
+
+class RecipeAttrBulkSerializer(serializers.Serializer):
+    """
+    Serializer for a list of recipe attribute names to upsert
+    """
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+class TagSerializer(RecipeAttrSerializer):
     """
     Serializer for tag object
     """
@@ -14,7 +161,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """
     Serializer for ingredient object
     """
@@ -25,15 +172,15 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     """
     Serialize a recipe object
     """
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -53,12 +200,177 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeBatchListSerializer(serializers.ListSerializer):
+    """
+    Validate and create a batch of recipes with a fixed number of queries
+    """
+    related_models = (('tags', Tag), ('ingredients', Ingredient))
+
+    def to_internal_value(self, data):
+        """
+        Validate every recipe, then resolve all the referenced tag and
+        ingredient ids with one query per model
+        :param data: list of recipe payloads
+        :return: list of validated recipes
+        """
+        validated = super().to_internal_value(data)
+        user = self.context['request'].user
+
+        errors = [{} for item in validated]
+        for field_name, model in self.related_models:
+            requested = {pk for item in validated
+                         for pk in item.get(field_name, [])}
+            existing = set(
+                model.objects.filter(user=user, id__in=requested).
+                values_list('id', flat=True)
+            )
+            for item, item_errors in zip(validated, errors):
+                missing = [pk for pk in dict.fromkeys(item.get(field_name, []))
+                           if pk not in existing]
+                if missing:
+                    item_errors[field_name] = [
+                        UserOwnedManyRelatedField.default_error_messages[
+                            'does_not_exist'
+                        ].format(pk_values=', '.join(map(str, missing)))
+                    ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return validated
+
+    def create(self, validated_data):
+        """
+        Insert the recipes and all their tag and ingredient links
+        in one transaction
+        :param validated_data: list of validated recipes
+        :return: list of recipes
+        """
+        related_names = [name for name, model in self.related_models]
+        recipes = [
+            Recipe(**{key: value for key, value in item.items()
+                      if key not in related_names})
+            for item in validated_data
+        ]
+
+        with transaction.atomic():
+            if connections[Recipe.objects.db].features.\
+                    can_return_rows_from_bulk_insert:
+                recipes = Recipe.objects.bulk_create(recipes)
+            else:
+                for recipe in recipes:
+                    recipe.save()
+
+            for field_name, model in self.related_models:
+                through = getattr(Recipe, field_name).through
+                column = f'{model._meta.model_name}_id'
+                through.objects.bulk_create([
+                    through(recipe_id=recipe.id, **{column: pk})
+                    for recipe, item in zip(recipes, validated_data)
+                    for pk in dict.fromkeys(item.get(field_name, []))
+                ])
+
+        for user_id in {recipe.user_id for recipe in recipes}:
+            bump_data_version(user_id)
+
+        return recipes
+
+
+class RecipeBatchSerializer(serializers.ModelSerializer):
+    """
+    Validate a recipe of a batch, leaving the tag and ingredient ids to be
+    resolved for the whole batch at once
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('title', 'ingredients', 'tags',
+                  'time_minutes', 'price', 'link')
+        list_serializer_class = RecipeBatchListSerializer
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """
-    Serializer for uploading image to recipe
+    Serializer for uploading image to recipe. Only the image header is
+    read here, decoding and verifying it is left to the image processing
+    queue, until which the image url is withheld.
     """
-    # incoming_data = serializers.ImageField
+    image = serializers.FileField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id',)
+        fields = ('id', 'image', 'image_status')
+        read_only_fields = ('id', 'image_status')
+
+    def to_representation(self, instance):
+        """
+        Return the image url only once the image is processed, as the
+        raw upload is kept private
+        :param instance: recipe object
+        :return: dict
+        """
+        data = super().to_representation(instance)
+        if instance.image_status in (Recipe.IMAGE_PENDING,
+                                     Recipe.IMAGE_PROCESSING):
+            data['image'] = None
+
+        return data
+
+    def validate_image(self, value):
+        """
+        Check the upload is an image of a supported format and size
+        :param value: uploaded file
+        :return: uploaded file
+        """
+        try:
+            read_image_header(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+
+        return value
+
+
+class RecipeRenditionSerializer(serializers.Serializer):
+    """
+    Validate the parameters of an image rendition
+    """
+    width = serializers.IntegerField()
+    # ?format= is taken by DRF's renderer negotiation
+    image_format = serializers.ChoiceField(choices=list(RENDITION_FORMATS),
+                                           default='jpeg')
+    quality = serializers.IntegerField(min_value=1, max_value=100,
+                                       required=False)
+    v = serializers.CharField(required=False)
+
+    def validate_width(self, value):
+        """
+        Limit widths to the configured ones, bounding the renditions
+        cached per image
+        :param value: width
+        :return: width
+        """
+        widths = settings.IMAGE_RENDITIONS['WIDTHS']
+        if value not in widths:
+            raise serializers.ValidationError(
+                f'Expected one of {", ".join(map(str, widths))}.'
+            )
+
+        return value
+
+    def validate(self, attrs):
+        """
+        Fill in the default quality
+        :param attrs: validated parameters
+        :return: parameters
+        """
+        attrs.setdefault('quality',
+                         settings.IMAGE_RENDITIONS['DEFAULT_QUALITY'])
+
+        return attrs
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.cache import bump_data_version
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_version_on_change(sender, instance, **kwargs):
+    """
+    Invalidate the cached responses and ETags of the owner of a changed
+    object. Deleting a recipe also removes its tag and ingredient links
+    without sending m2m_changed.
+    """
+    bump_data_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_version_on_link_change(sender, instance, action, **kwargs):
+    """
+    Invalidate the cached responses of a user when tags or ingredients
+    are linked to or unlinked from recipes, which changes the
+    assigned_only lists
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_data_version(instance.user_id)
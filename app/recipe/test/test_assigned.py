@@ -0,0 +1,149 @@
+import os
+import time
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Ingredient, Recipe
+from recipe.views import IngredientViewSet
+
+
+def create_links(user, ingredient_count, recipe_count, per_recipe):
+    """
+    Create ingredients and recipes each using a rotating slice of them
+    :param user: user object
+    :param ingredient_count: number of ingredients
+    :param recipe_count: number of recipes
+    :param per_recipe: number of ingredients per recipe
+    :return: None
+    """
+    Ingredient.objects.bulk_create([
+        Ingredient(user=user, name=f'Ingredient {i}')
+        for i in range(ingredient_count)
+    ])
+    Recipe.objects.bulk_create([
+        Recipe(user=user, title=f'Recipe {i}', time_minutes=10, price=5)
+        for i in range(recipe_count)
+    ])
+    # Leave the last ingredient unused
+    ingredient_ids = list(Ingredient.objects.filter(user=user).
+                          order_by('id').values_list('id', flat=True))[:-1]
+    recipe_ids = Recipe.objects.filter(user=user).values_list('id',
+                                                              flat=True)
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_ids[(i + j) % len(ingredient_ids)]
+        )
+        for i, recipe_id in enumerate(recipe_ids)
+        for j in range(per_recipe)
+    ])
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def assigned_queryset(user):
+    """
+    Return the queryset of the ingredient list with assigned_only set
+    :param user: user object
+    :return: queryset
+    """
+    request = Request(APIRequestFactory().get('/', {'assigned_only': 1}))
+    request.user = user
+    view = IngredientViewSet(request=request, format_kwarg=None,
+                             action='list')
+
+    return view.get_queryset()
+
+
+class AssignedOnlyQueryTest(TestCase):
+    """
+    Test the assigned_only filter is a semijoin
+    """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        create_links(self.user, 20, 200, 5)
+
+    def test_assigned_only_returns_used_ingredients_once(self):
+        """
+        Test each used ingredient is returned once and unused ones not
+        :return: None
+        """
+        names = list(assigned_queryset(self.user).
+                     values_list('name', flat=True))
+
+        self.assertEqual(len(names), 19)
+        self.assertEqual(len(set(names)), 19)
+        self.assertNotIn('Ingredient 19', names)
+
+    def test_assigned_only_plan_has_no_dedupe(self):
+        """
+        Test the plan probes the through table instead of joining and
+        deduplicating every recipe link
+        :return: None
+        """
+        queryset = assigned_queryset(self.user)
+
+        self.assertNotIn('DISTINCT', str(queryset.query))
+        if connection.vendor != 'postgresql':
+            return
+        plan = queryset.explain()
+        self.assertNotIn('Unique', plan)
+        self.assertIn('Semi Join', plan)
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class AssignedOnlyBenchmark(TestCase):
+    """
+    Benchmark assigned_only against the join and DISTINCT it replaces
+    """
+
+    def time(self, queryset, repeat=5):
+        """
+        Return the best time of listing the names of a queryset
+        :param queryset: queryset to evaluate
+        :param repeat: number of runs
+        :return: seconds
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.values_list('name', flat=True))
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
+
+    def test_assigned_only_scaling(self):
+        """
+        Time both queries while growing the number of recipe links
+        :return: None
+        """
+        for i, (ingredients, recipes) in enumerate(((200, 1000),
+                                                    (200, 10000),
+                                                    (200, 50000))):
+            with self.subTest(ingredients=ingredients, recipes=recipes):
+                user = get_user_model().objects.create_user(
+                    email=f'bench{i}@test.com',
+                    password='testpass'
+                )
+                create_links(user, ingredients, recipes, 5)
+                joined = Ingredient.objects.filter(
+                    user=user, recipe__isnull=False
+                ).order_by('-name').distinct()
+
+                joined_time = self.time(joined)
+                exists_time = self.time(assigned_queryset(user))
+                print(f'\n{ingredients} ingredients, {recipes * 5} links: '
+                      f'join + distinct {joined_time * 1000:.1f}ms, '
+                      f'exists {exists_time * 1000:.1f}ms')
@@ -0,0 +1,158 @@
+import os
+import time
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.serializers import (RecipeSerializer, TagSerializer,
+                                IngredientSerializer)
+
+
+def create_recipes(user, count, tags, ingredients):
+    """
+    Bulk create recipes, each linked to a rotating slice of the tags
+    and ingredients
+    :param user: user object
+    :param count: number of recipes
+    :param tags: list of tags
+    :param ingredients: list of ingredients
+    :return: None
+    """
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, title=f'Recipe {i}', time_minutes=i % 90,
+               price=f'{i % 1000}.{i % 100:02d}', link=f'https://{i}.com')
+        for i in range(count)
+    ])
+    if recipes[0].id is None:
+        recipes = list(Recipe.objects.filter(user=user).order_by('id'))
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for i, recipe in enumerate(recipes)
+        for tag in tags[i % len(tags):][:3]
+    ])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(recipe_id=recipe.id,
+                                   ingredient_id=ingredient.id)
+        for i, recipe in enumerate(recipes)
+        for ingredient in ingredients[i % len(ingredients):][:2]
+    ])
+
+
+def slow_recipe_data(queryset):
+    """
+    Serialize recipes the regular way, with the list prefetches
+    :param queryset: recipe queryset
+    :return: serialized data
+    """
+    queryset = queryset.prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+        Prefetch('ingredients',
+                 queryset=Ingredient.objects.only('id').order_by('id')),
+    )
+    return RecipeSerializer(queryset, many=True).data
+
+
+def fast_recipe_data(queryset):
+    """
+    Serialize recipes through the fast representation
+    :param queryset: recipe queryset
+    :return: serialized data
+    """
+    rows = queryset.values(*RecipeSerializer.get_fast_columns())
+    return RecipeSerializer.fast_representation(list(rows))
+
+
+class FastRepresentationTest(TestCase):
+    """
+    Test the fast representation matches the serializers byte for byte
+    """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                     for i in range(5)]
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+            for i in range(4)
+        ]
+        self.renderer = JSONRenderer()
+
+    def test_recipe_representation_identical(self):
+        """
+        Test recipes render identically, including decimal prices,
+        blank links and recipes without tags or ingredients
+        :return: None
+        """
+        create_recipes(self.user, 20, self.tags, self.ingredients)
+        Recipe.objects.create(user=self.user, title='Plain',
+                              time_minutes=1, price='0.50')
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        slow = self.renderer.render(slow_recipe_data(queryset))
+        fast = self.renderer.render(fast_recipe_data(queryset))
+
+        self.assertEqual(fast, slow)
+
+    def test_tag_and_ingredient_representation_identical(self):
+        """
+        Test tags and ingredients render identically
+        :return: None
+        """
+        for serializer_class, model in ((TagSerializer, Tag),
+                                        (IngredientSerializer, Ingredient)):
+            queryset = model.objects.filter(user=self.user).order_by('-name')
+            rows = queryset.values(*serializer_class.get_fast_columns())
+
+            slow = self.renderer.render(
+                serializer_class(queryset, many=True).data
+            )
+            fast = self.renderer.render(
+                serializer_class.fast_representation(list(rows))
+            )
+
+            self.assertEqual(fast, slow)
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class FastRepresentationBenchmark(TestCase):
+    """
+    Benchmark the fast representation against the serializer
+    """
+
+    def test_recipe_list_10k_rows(self):
+        """
+        Time serializing 10k recipes both ways
+        :return: None
+        """
+        user = get_user_model().objects.create_user(
+            email='bench@test.com',
+            password='testpass'
+        )
+        tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                for i in range(20)]
+        ingredients = [Ingredient.objects.create(user=user, name=f'Ing {i}')
+                       for i in range(20)]
+        create_recipes(user, 10000, tags, ingredients)
+        queryset = Recipe.objects.filter(user=user).order_by('-id')
+
+        timings = {}
+        for name, build in (('serializer', slow_recipe_data),
+                            ('fast', fast_recipe_data)):
+            start = time.perf_counter()
+            data = build(queryset)
+            timings[name] = time.perf_counter() - start
+            self.assertEqual(len(data), 10000)
+
+        print(f"\n10k recipes: serializer {timings['serializer']:.3f}s, "
+              f"fast {timings['fast']:.3f}s, "
+              f"speedup {timings['serializer'] / timings['fast']:.1f}x")
+        self.assertLess(timings['fast'], timings['serializer'])
@@ -0,0 +1,157 @@
+import os
+import time
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.filters import RelatedIdFilter
+from recipe.test.test_fastserializer import create_recipes
+
+
+TAG_FILTER = RelatedIdFilter('tags', Recipe.tags.through, 'tag_id')
+
+
+class RelatedIdFilterTest(TestCase):
+    """
+    Test filtering recipes by related ids
+    """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.both = Recipe.objects.create(user=self.user, title='Salad',
+                                          time_minutes=5, price=3)
+        self.both.tags.add(self.vegan, self.quick)
+        self.vegan_only = Recipe.objects.create(user=self.user, title='Stew',
+                                                time_minutes=90, price=8)
+        self.vegan_only.tags.add(self.vegan)
+        Recipe.objects.create(user=self.user, title='Steak',
+                              time_minutes=20, price=20)
+
+    def filter(self, **params):
+        """
+        Return the ids of the recipes matching the query parameters
+        :param params: query parameters
+        :return: list of recipe ids
+        """
+        queryset = TAG_FILTER.filter_queryset(Recipe.objects.all(), params)
+        return sorted(queryset.values_list('id', flat=True))
+
+    def test_any_mode_returns_each_recipe_once(self):
+        """
+        Test recipes with several of the tags are not duplicated
+        :return: None
+        """
+        ids = self.filter(tags=f'{self.vegan.id},{self.quick.id}')
+
+        self.assertEqual(ids, [self.both.id, self.vegan_only.id])
+
+    def test_all_mode_requires_every_tag(self):
+        """
+        Test only recipes with every tag match, repeated ids counting once
+        :return: None
+        """
+        ids = self.filter(
+            tags=f'{self.vegan.id},{self.quick.id},{self.vegan.id}',
+            tags_mode='all'
+        )
+
+        self.assertEqual(ids, [self.both.id])
+
+    def test_all_mode_single_tag(self):
+        """
+        Test all mode with one tag matches like any mode
+        :return: None
+        """
+        ids = self.filter(tags=str(self.vegan.id), tags_mode='all')
+
+        self.assertEqual(ids, [self.both.id, self.vegan_only.id])
+
+    def test_invalid_params_rejected(self):
+        """
+        Test malformed ids and unknown modes raise validation errors
+        :return: None
+        """
+        with self.assertRaises(ValidationError):
+            self.filter(tags='1,a')
+        with self.assertRaises(ValidationError):
+            self.filter(tags='1', tags_mode='most')
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'),
+                     'set RUN_BENCHMARKS=1 to run benchmarks')
+class RelatedIdFilterBenchmark(TestCase):
+    """
+    Benchmark the subquery filters against filtering through joins
+    """
+
+    def time(self, queryset, repeat=5):
+        """
+        Return the best time of evaluating a queryset
+        :param queryset: queryset to evaluate
+        :param repeat: number of runs
+        :return: tuple of seconds and number of rows
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = list(queryset.values_list('id', flat=True))
+            timings.append(time.perf_counter() - start)
+
+        return min(timings), len(rows)
+
+    def test_filter_user_with_many_tags(self):
+        """
+        Time filtering 20k recipes carrying 3 of 500 tags each
+        :return: None
+        """
+        user = get_user_model().objects.create_user(
+            email='bench@test.com',
+            password='testpass'
+        )
+        Tag.objects.bulk_create([Tag(user=user, name=f'Tag {i}')
+                                 for i in range(500)])
+        tags = list(Tag.objects.filter(user=user).order_by('id'))
+        ingredients = [Ingredient.objects.create(user=user, name='Salt')]
+        create_recipes(user, 20000, tags, ingredients)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        tag_ids = [tag.id for tag in tags[:50]]
+        recipes = Recipe.objects.filter(user=user)
+
+        joined_all = recipes
+        for tag_id in tag_ids[:3]:
+            joined_all = joined_all.filter(tags__id=tag_id)
+        cases = {
+            'any': (
+                recipes.filter(tags__id__in=tag_ids).distinct(),
+                TAG_FILTER.filter_queryset(recipes, {
+                    'tags': ','.join(map(str, tag_ids))
+                }),
+            ),
+            'all': (
+                joined_all,
+                TAG_FILTER.filter_queryset(recipes, {
+                    'tags': ','.join(map(str, tag_ids[:3])),
+                    'tags_mode': 'all',
+                }),
+            ),
+        }
+
+        for mode, (joined, subquery) in cases.items():
+            joined_time, joined_rows = self.time(joined)
+            subquery_time, subquery_rows = self.time(subquery)
+            self.assertEqual(joined_rows, subquery_rows)
+            print(f'\n{mode} mode, {subquery_rows} rows: '
+                  f'joins {joined_time * 1000:.1f}ms, '
+                  f'subquery {subquery_time * 1000:.1f}ms')
@@ -0,0 +1,374 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from io import StringIO
+from unittest.mock import call, patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.images import image_queue, process_recipe_image
+
+
+def image_upload_url(recipe_id):
+    """
+    Return the image upload url of a recipe
+    :param recipe_id: recipe object id
+    :return: url
+    """
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def image_status_url(recipe_id):
+    """
+    Return the image status url of a recipe
+    :param recipe_id: recipe object id
+    :return: url
+    """
+    return reverse('recipe:recipe-image-status', args=[recipe_id])
+
+
+def sample_image(name='image.jpg', size=(20, 10), orientation=None):
+    """
+    Return an in-memory JPEG upload
+    :param name: file name
+    :param size: width and height
+    :param orientation: EXIF orientation tag value
+    :return: file object
+    """
+    file = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    Image.new('RGB', size).save(file, format='JPEG', exif=exif.tobytes())
+    file.name = name
+    file.seek(0)
+
+    return file
+
+
+def png_header(size):
+    """
+    Return a PNG declaring a size but holding no pixel data, as found
+    at the start of a decompression bomb
+    :param size: declared width and height
+    :return: file object
+    """
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + \
+            struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    file = io.BytesIO(
+        b'\x89PNG\r\n\x1a\n' +
+        chunk(b'IHDR', struct.pack('>IIBBBBB', *size, 8, 2, 0, 0, 0)) +
+        chunk(b'IDAT', b'') + chunk(b'IEND', b'')
+    )
+    file.name = 'image.png'
+
+    return file
+
+
+class RecipeImageProcessingTest(TransactionTestCase):
+    """
+    Test image uploads are stored and processed in the background
+    """
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_UPLOAD={'MAX_BYTES': 10000, 'MAX_PIXELS': 100000}
+        )
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Curry',
+                                            time_minutes=10, price=5)
+
+    def tearDown(self) -> None:
+        image_queue.join()
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload(self, file):
+        """
+        Upload an image and wait for its processing
+        :param file: file object
+        :return: tuple of the upload and status responses
+        """
+        res = self.apiclient.post(image_upload_url(self.recipe.id),
+                                  {'image': file}, format='multipart')
+        image_queue.join()
+
+        return res, self.apiclient.get(image_status_url(self.recipe.id))
+
+    def test_upload_image_processed(self):
+        """
+        Test an upload is accepted, then oriented and re-encoded
+        :return: None
+        """
+        res, status_res = self.upload(sample_image(orientation=6))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertIsNone(res.data['image'])
+        self.assertEqual(status_res.data['image_status'], Recipe.IMAGE_READY)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.startswith('uploads/recipe/'))
+        self.assertTrue(status_res.data['image'].endswith(
+            self.recipe.image.name
+        ))
+        raw_dir = os.path.join(self.media_root, 'uploads', 'raw')
+        self.assertEqual(
+            [files for _, _, files in os.walk(raw_dir) if files], []
+        )
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (10, 20))
+            self.assertNotIn(0x0112, image.getexif())
+
+    def upload_unprocessed(self, recipe, file=None):
+        """
+        Upload an image to a recipe without processing it, as if the
+        process stopped before
+        :param recipe: recipe object
+        :param file: file object, a sample image by default
+        :return: upload response
+        """
+        with patch.object(image_queue, 'submit'):
+            res = self.apiclient.post(image_upload_url(recipe.id),
+                                      {'image': file or sample_image()},
+                                      format='multipart')
+        recipe.refresh_from_db()
+
+        return res
+
+    def test_raw_upload_not_served(self):
+        """
+        Test an image waiting for processing is stored out of the served
+        media and its url is not given out
+        :return: None
+        """
+        self.upload_unprocessed(self.recipe)
+
+        res = self.apiclient.get(image_status_url(self.recipe.id))
+
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertIsNone(res.data['image'])
+        name = self.recipe.image.name
+        self.assertTrue(name.startswith('uploads/raw/'))
+        self.assertTrue(os.path.isfile(os.path.join(self.media_root, name)))
+        self.assertEqual(self.client.get(f'/media/{name}').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_requeue_unfinished_images(self):
+        """
+        Test the images left pending or processing are queued again
+        :return: None
+        """
+        recipes = [self.recipe] + [
+            Recipe.objects.create(user=self.user, title=title,
+                                  time_minutes=10, price=5)
+            for title in ('Soup', 'Salad')
+        ]
+        for recipe in recipes:
+            self.upload_unprocessed(recipe)
+        Recipe.objects.filter(id=recipes[1].id).update(
+            image_status=Recipe.IMAGE_PROCESSING
+        )
+        Recipe.objects.filter(id=recipes[2].id).update(
+            image_status=Recipe.IMAGE_READY
+        )
+
+        with patch.object(image_queue, 'submit') as submit:
+            self.assertEqual(image_queue.requeue(), 2)
+
+        self.assertEqual(submit.call_args_list, [
+            call(recipe.id, recipe.image.name) for recipe in recipes[:2]
+        ])
+
+    def test_process_pending_images(self):
+        """
+        Test the command processes the images left pending
+        :return: None
+        """
+        self.upload_unprocessed(self.recipe)
+        raw_name = self.recipe.image.name
+
+        out = StringIO()
+        call_command('process_pending_images', stdout=out)
+
+        self.assertIn('Processed 1 recipe images', out.getvalue())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(self.recipe.image.name.startswith('uploads/recipe/'))
+        self.assertFalse(self.recipe.image.storage.exists(raw_name))
+
+    def test_upload_invalid_image_rejected(self):
+        """
+        Test an upload that is not an image is rejected and not stored
+        :return: None
+        """
+        file = io.BytesIO(b'not an image')
+        file.name = 'image.jpg'
+
+        res, status_res = self.upload(file)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(status_res.data['image'])
+        self.assertEqual(
+            [files for _, _, files in os.walk(self.media_root) if files], []
+        )
+
+    def test_undecodable_image_fails(self):
+        """
+        Test an image with a valid header that cannot be decoded ends up
+        failed and removed
+        :return: None
+        """
+        res, status_res = self.upload(png_header((20, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(status_res.data['image_status'],
+                         Recipe.IMAGE_FAILED)
+        self.assertIsNone(status_res.data['image'])
+
+    def test_failed_image_deleted_meanwhile_keeps_shared_file(self):
+        """
+        Test an image failing after its recipe was deleted does not
+        release the file a second time, which another recipe still uses
+        :return: None
+        """
+        other = Recipe.objects.create(user=self.user, title='Soup',
+                                      time_minutes=10, price=5)
+        content = png_header((20, 10)).getvalue()
+        for recipe in (self.recipe, other):
+            file = io.BytesIO(content)
+            file.name = 'image.png'
+            self.upload_unprocessed(recipe, file)
+        name = other.image.name
+        self.assertEqual(self.recipe.image.name, name)
+
+        def delete_then_fail(file):
+            Recipe.objects.get(id=self.recipe.id).delete()
+            raise ValueError('File is not a valid image')
+
+        with patch('recipe.images.reencode_image', delete_then_fail):
+            process_recipe_image(self.recipe.id, name)
+
+        self.assertTrue(other.image.storage.exists(name))
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, name)
+
+    def test_upload_too_large_rejected(self):
+        """
+        Test an upload over the byte limit is refused while streaming
+        :return: None
+        """
+        file = io.BytesIO(os.urandom(20000))
+        file.name = 'image.jpg'
+
+        res, _ = self.upload(file)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_too_many_pixels_rejected(self):
+        """
+        Test images over the pixel limit are rejected from their header,
+        including ones beyond Pillow's own decompression bomb limit
+        :return: None
+        """
+        for file in (sample_image(size=(1000, 101)),
+                     png_header((100000, 100000))):
+            with patch('recipe.images.ImageOps.exif_transpose') as decode:
+                res, _ = self.upload(file)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('pixels', res.data['image'][0])
+            decode.assert_not_called()
+
+    def test_upload_unsupported_format_rejected(self):
+        """
+        Test images in formats that are not accepted are rejected
+        :return: None
+        """
+        file = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(file, format='BMP')
+        file.name = 'image.bmp'
+        file.seek(0)
+
+        res, _ = self.upload(file)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_without_file_invalid(self):
+        """
+        Test an upload without a file is rejected
+        :return: None
+        """
+        res = self.apiclient.post(image_upload_url(self.recipe.id),
+                                  {'image': 'invalid image'},
+                                  format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_rejected_when_queue_full(self):
+        """
+        Test uploads are refused while the processing queue is full
+        :return: None
+        """
+        with patch.object(image_queue, 'full', return_value=True):
+            res = self.apiclient.post(image_upload_url(self.recipe.id),
+                                      {'image': sample_image()},
+                                      format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_identical_uploads_share_file(self):
+        """
+        Test recipes uploading the same image share one file, which is
+        removed with the last recipe using it
+        :return: None
+        """
+        other = Recipe.objects.create(user=self.user, title='Soup',
+                                      time_minutes=10, price=5)
+        content = sample_image().getvalue()
+        for recipe in (self.recipe, other):
+            file = io.BytesIO(content)
+            file.name = 'image.jpg'
+            self.apiclient.post(image_upload_url(recipe.id),
+                                {'image': file}, format='multipart')
+            image_queue.join()
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        storage = self.recipe.image.storage
+        name = other.image.name
+
+        self.assertEqual(self.recipe.image.name, name)
+        self.recipe.delete()
+        self.assertTrue(storage.exists(name))
+        other.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(
+            [files for _, _, files in os.walk(self.media_root) if files], []
+        )
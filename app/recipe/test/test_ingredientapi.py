@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
@@ -9,6 +10,8 @@ from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+INGREDIENT_BULK_URL = reverse('recipe:ingredient-bulk')
+INGREDIENT_COUNTS_URL = reverse('recipe:ingredient-counts')
 
 
 class PublicIngredientApiTest(TestCase):
@@ -51,6 +54,7 @@ class PrivateIngredientApiTest(TestCase):
         )
         self.apiclient = APIClient()
         self.apiclient.force_authenticate(user=self.user)
+        cache.clear()
 
     def test_retrieve_ingredients_list(self):
         """
@@ -72,7 +76,7 @@ class PrivateIngredientApiTest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """
@@ -94,8 +98,8 @@ class PrivateIngredientApiTest(TestCase):
         res = self.apiclient.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successful(self):
         """
@@ -153,8 +157,8 @@ class PrivateIngredientApiTest(TestCase):
         serializer_one = IngredientSerializer(ingredient_one)
         serializer_two = IngredientSerializer(ingredient_two)
 
-        self.assertIn(serializer_one.data, res.data)
-        self.assertNotIn(serializer_two.data, res.data)
+        self.assertIn(serializer_one.data, res.data['results'])
+        self.assertNotIn(serializer_two.data, res.data['results'])
 
     def test_retrieve_ingredients_assigned_unique(self):
         """
@@ -188,4 +192,74 @@ class PrivateIngredientApiTest(TestCase):
 
         res = self.apiclient.get(INGREDIENT_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_assigned_only_invalidated_on_recipe_delete(self):
+        """
+        Test deleting the only recipe using an ingredient invalidates
+        the cached assigned_only list
+        :return: None
+        """
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='title',
+            time_minutes=10,
+            price=10,
+        )
+        recipe.ingredients.add(ingredient)
+        res = self.apiclient.get(INGREDIENT_URL, {'assigned_only': 1})
+        self.assertEqual(len(res.data['results']), 1)
+
+        recipe.delete()
+        res = self.apiclient.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_bulk_upsert_ingredients(self):
+        """
+        Test bulk upserting ingredients creates only the missing names
+        and invalidates the cached list
+        :return: None
+        """
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.apiclient.get(INGREDIENT_URL)
+
+        res = self.apiclient.post(
+            INGREDIENT_BULK_URL,
+            {'names': ['Pepper', 'SALT']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[1], {'id': salt.id, 'name': 'Salt'})
+        res = self.apiclient.get(INGREDIENT_URL)
+        self.assertEqual([ingredient['name']
+                          for ingredient in res.data['results']],
+                         ['Salt', 'Pepper'])
+
+    def test_ingredient_counts_filtered_by_all_ingredients(self):
+        """
+        Test counting ingredients over the recipes having all the
+        requested ingredients
+        :return: None
+        """
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        pepper = Ingredient.objects.create(user=self.user, name='Pepper')
+        both = Recipe.objects.create(user=self.user, title='Steak',
+                                     time_minutes=10, price=10)
+        both.ingredients.add(salt, pepper)
+        salted = Recipe.objects.create(user=self.user, title='Chips',
+                                       time_minutes=10, price=10)
+        salted.ingredients.add(salt)
+
+        res = self.apiclient.get(INGREDIENT_COUNTS_URL, {
+            'ingredients': f'{salt.id},{pepper.id}',
+            'ingredients_mode': 'all',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': salt.id, 'name': 'Salt', 'recipes': 1},
+            {'id': pepper.id, 'name': 'Pepper', 'recipes': 1},
+        ])
@@ -2,9 +2,15 @@
 # import os
 #
 # from PIL import Image
+import csv
+import io
+import json
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 # from django.db import transaction
 
@@ -12,10 +18,13 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.pagination import RecipePagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -119,7 +128,7 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_limited_to_user(self):
         """
@@ -139,8 +148,8 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipe, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """
@@ -159,6 +168,160 @@ class PrivateRecipeApiTest(TestCase):
 
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_query_count_constant(self):
+        """
+        Test listing recipes runs the same number of queries
+        regardless of how many recipes are returned
+        :return: None
+        """
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        for count in (1, 10):
+            for _ in range(count):
+                recipe = sample_recipe(user=self.user)
+                recipe.tags.add(tag)
+                recipe.ingredients.add(ingredient)
+
+            with self.assertNumQueries(3):
+                res = self.apiclient.get(RECIPE_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+
+    def test_view_recipe_detail_query_count(self):
+        """
+        Test the recipe detail loads nested tags and ingredients
+        with a fixed number of queries
+        :return: None
+        """
+        recipe = sample_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        with self.assertNumQueries(3):
+            res = self.apiclient.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
+    def test_list_recipes_paginated_by_cursor(self):
+        """
+        Test following the cursor links returns every recipe once,
+        newest first, without OFFSET or COUNT queries
+        :return: None
+        """
+        recipes = [sample_recipe(self.user, title=f'Recipe {i}')
+                   for i in range(5)]
+
+        seen = []
+        url = RECIPE_URL
+        params = {'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                res = self.apiclient.get(url, params)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                seen.extend(recipe['id'] for recipe in res.data['results'])
+                url, params = res.data['next'], None
+
+        self.assertEqual(seen, [recipe.id for recipe in reversed(recipes)])
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_list_recipes_invalid_cursor(self):
+        """
+        Test an invalid cursor is rejected
+        :return: None
+        """
+        res = self.apiclient.get(RECIPE_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_recipes_cursor_wrong_types(self):
+        """
+        Test a cursor whose values do not fit the ordering columns is
+        rejected
+        :return: None
+        """
+        sample_recipe(self.user)
+        pagination = RecipePagination()
+
+        for position in (['x', 1], [{'a': 1}, 1], [1, None], [1, [2]]):
+            with self.subTest(position=position):
+                res = self.apiclient.get(RECIPE_URL, {
+                    'cursor': pagination.encode_cursor(position)
+                })
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_recipes_not_modified(self):
+        """
+        Test a recipe list request with a current ETag returns 304
+        without querying the database
+        :return: None
+        """
+        sample_recipe(user=self.user)
+        res = self.apiclient.get(RECIPE_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.apiclient.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_view_recipe_detail_etag_changes_on_update(self):
+        """
+        Test updating a recipe invalidates the ETag of its detail
+        :return: None
+        """
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.apiclient.get(url)['ETag']
+        self.assertEqual(
+            self.apiclient.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        self.apiclient.patch(url, {'title': 'New title'})
+        res = self.apiclient.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_view_recipe_detail_wildcard_not_modified(self):
+        """
+        Test If-None-Match: * returns 304 for an existing recipe
+        :return: None
+        """
+        recipe = sample_recipe(user=self.user)
+
+        res = self.apiclient.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_view_recipe_detail_wildcard_not_found(self):
+        """
+        Test If-None-Match: * returns 404 for missing recipes and
+        recipes of other users
+        :return: None
+        """
+        user_two = get_user_model().objects.create_user(
+            'test1@test1.com',
+            'password1'
+        )
+        recipe = sample_recipe(user=user_two)
+
+        for url in (detail_url(recipe.id), detail_url(recipe.id + 1)):
+            res = self.apiclient.get(url, HTTP_IF_NONE_MATCH='*')
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_basic_recipe(self):
         """
         Test creating a recipe
@@ -226,6 +389,238 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(ingredient_one, ingredients)
         self.assertIn(ingredient_two, ingredients)
 
+    def test_create_recipe_validates_ids_in_one_query(self):
+        """
+        Test the tag and ingredient ids of a recipe are validated with
+        one query each, however many are submitted
+        :return: None
+        """
+        ingredients = [sample_ingredient(self.user, f'Ingredient {i}')
+                       for i in range(40)]
+        query_counts = []
+        for size in (1, 40):
+            payload = {
+                'title': 'Stew',
+                'time_minutes': 60,
+                'price': '9.00',
+                'tags': [],
+                'ingredients': [ingredient.id
+                                for ingredient in ingredients[:size]]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.apiclient.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data['ingredients']), size)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_create_recipe_with_other_users_tag_invalid(self):
+        """
+        Test a recipe cannot reference another user's tags, and all
+        the unknown ids are reported together
+        :return: None
+        """
+        user_two = get_user_model().objects.create_user(
+            'test1@test1.com',
+            'password1'
+        )
+        foreign_tag = sample_tag(user_two)
+        tag = sample_tag(self.user)
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 20,
+            'price': '10.00',
+            'tags': [tag.id, foreign_tag.id, 9999],
+            'ingredients': []
+        }
+
+        res = self.apiclient.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 1)
+        self.assertIn(f'{foreign_tag.id}, 9999', res.data['tags'][0])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_batch_create_recipes(self):
+        """
+        Test creating a batch of recipes with tags and ingredients
+        :return: None
+        """
+        tag = sample_tag(self.user)
+        ingredient_one = sample_ingredient(self.user, 'Ginger')
+        ingredient_two = sample_ingredient(self.user, 'Chocolate')
+        payload = [
+            {'title': 'Curry', 'time_minutes': 20, 'price': '10.00',
+             'tags': [tag.id], 'ingredients': [ingredient_one.id]},
+            {'title': 'Cake', 'time_minutes': 60, 'price': '7.50',
+             'ingredients': [ingredient_one.id, ingredient_two.id]},
+        ]
+
+        res = self.apiclient.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([recipe['title'] for recipe in res.data],
+                         ['Curry', 'Cake'])
+        curry = Recipe.objects.get(user=self.user, title='Curry')
+        cake = Recipe.objects.get(user=self.user, title='Cake')
+        self.assertEqual(list(curry.tags.all()), [tag])
+        self.assertEqual(set(cake.ingredients.all()),
+                         {ingredient_one, ingredient_two})
+        self.assertEqual(res.data[1], RecipeSerializer(cake).data)
+
+    @skipUnlessDBFeature('can_return_rows_from_bulk_insert')
+    def test_batch_create_query_count_constant(self):
+        """
+        Test the number of queries of a batch does not depend on
+        the number of recipes, tags or ingredients
+        :return: None
+        """
+        tags = [sample_tag(self.user, f'Tag {i}') for i in range(10)]
+        query_counts = []
+        for size in (1, 10):
+            payload = [
+                {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00',
+                 'tags': [tag.id for tag in tags[:size]]}
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                res = self.apiclient.post(BATCH_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_batch_create_reports_item_errors(self):
+        """
+        Test an invalid batch reports errors per recipe and
+        creates nothing
+        :return: None
+        """
+        user_two = get_user_model().objects.create_user(
+            'test1@test1.com',
+            'password1'
+        )
+        foreign_tag = sample_tag(user_two)
+        payload = [
+            {'title': 'Valid', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Foreign tag', 'time_minutes': 5, 'price': '1.00',
+             'tags': [foreign_tag.id]},
+            {'title': '', 'time_minutes': 5, 'price': '1.00'},
+        ]
+
+        res = self.apiclient.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[2])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+        del payload[2]
+        res = self.apiclient.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_batch_create_requires_list(self):
+        """
+        Test a batch payload must be a list
+        :return: None
+        """
+        payload = {'title': 'Curry', 'time_minutes': 20, 'price': '10.00'}
+
+        res = self.apiclient.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def create_export_recipes(self):
+        """
+        Create recipes of the user and of another user to export
+        :return: None
+        """
+        other_user = get_user_model().objects.create_user(
+            email='other@test.com',
+            password='testpass'
+        )
+        sample_recipe(user=other_user, title='Not mine')
+        vegan = sample_tag(user=self.user, name='Vegan')
+        dinner = sample_tag(user=self.user, name='Dinner')
+        salt = sample_ingredient(user=self.user, name='Salt')
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe, {i}',
+                                   price='2.50')
+            recipe.tags.add(vegan, dinner)
+            recipe.ingredients.add(salt)
+        sample_recipe(user=self.user, title='Plain')
+
+    def test_export_recipes_ndjson(self):
+        """
+        Test exporting the user's recipes as NDJSON with related names
+        :return: None
+        """
+        self.create_export_recipes()
+
+        res = self.apiclient.get(EXPORT_URL)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['title'], 'Plain')
+        self.assertEqual(rows[0]['tags'], [])
+        self.assertEqual(rows[1]['title'], 'Recipe, 4')
+        self.assertEqual(rows[1]['price'], '2.50')
+        self.assertEqual(rows[1]['tags'], ['Dinner', 'Vegan'])
+        self.assertEqual(rows[1]['ingredients'], ['Salt'])
+
+    def test_export_recipes_csv(self):
+        """
+        Test exporting the user's recipes as CSV
+        :return: None
+        """
+        self.create_export_recipes()
+
+        res = self.apiclient.get(EXPORT_URL, {'export_format': 'csv'})
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1]['title'], 'Recipe, 4')
+        self.assertEqual(rows[1]['tags'], 'Dinner;Vegan')
+        self.assertEqual(rows[1]['ingredients'], 'Salt')
+
+    def test_export_recipes_batches_related_queries(self):
+        """
+        Test the related names are fetched once per chunk of recipes
+        :return: None
+        """
+        self.create_export_recipes()
+
+        with patch('recipe.views.RecipeViewSet.export_chunk_size', 2):
+            res = self.apiclient.get(EXPORT_URL)
+            with CaptureQueriesContext(connection) as queries:
+                lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 6)
+        related = [query for query in queries.captured_queries
+                   if 'core_recipe_tags' in query['sql'] or
+                   'core_recipe_ingredients' in query['sql']]
+        self.assertEqual(len(related), 6)
+
+    def test_export_recipes_invalid_format(self):
+        """
+        Test an unknown export format is rejected
+        :return: None
+        """
+        res = self.apiclient.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_partial_update_recipe(self):
         """
         Test updating a recipe partially with patch
@@ -354,9 +749,9 @@ class RecipeImageUploadImageTest(TestCase):
         serialzer_three = RecipeSerializer(recipe_three)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(serialzer_one.data, res.data)
-        self.assertIn(serialzer_two.data, res.data)
-        self.assertNotIn(serialzer_three.data, res.data)
+        self.assertIn(serialzer_one.data, res.data['results'])
+        self.assertIn(serialzer_two.data, res.data['results'])
+        self.assertNotIn(serialzer_three.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """
@@ -384,6 +779,55 @@ class RecipeImageUploadImageTest(TestCase):
         serializer_one = RecipeSerializer(recipe_one)
         serializer_two = RecipeSerializer(recipe_two)
         serializer_three = RecipeSerializer(recipe_three)
-        self.assertIn(serializer_one.data, res.data)
-        self.assertIn(serializer_two.data, res.data)
-        self.assertNotIn(serializer_three.data, res.data)
+        self.assertIn(serializer_one.data, res.data['results'])
+        self.assertIn(serializer_two.data, res.data['results'])
+        self.assertNotIn(serializer_three.data, res.data['results'])
+
+    def test_filter_recipes_by_tags_not_duplicated(self):
+        """
+        Test a recipe with several of the requested tags is listed once
+        :return: None
+        """
+        recipe = sample_recipe(user=self.user, title='Vegan curry')
+        tag_one = sample_tag(user=self.user, name='Vegan')
+        tag_two = sample_tag(user=self.user, name='Curry')
+        recipe.tags.add(tag_one, tag_two)
+
+        res = self.apiclient.get(
+            RECIPE_URL,
+            {'tags': f'{tag_one.id},{tag_two.id}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_filter_recipes_by_all_ingredients(self):
+        """
+        Test returning only recipes with all the requested ingredients
+        :return: None
+        """
+        recipe_one = sample_recipe(user=self.user, title='Cheese on toast')
+        recipe_two = sample_recipe(user=self.user, title='Toast')
+        cheese = sample_ingredient(user=self.user, name='Cheese')
+        bread = sample_ingredient(user=self.user, name='Bread')
+        recipe_one.ingredients.add(cheese, bread)
+        recipe_two.ingredients.add(bread)
+
+        res = self.apiclient.get(RECIPE_URL, {
+            'ingredients': f'{cheese.id},{bread.id}',
+            'ingredients_mode': 'all',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data['results']],
+                         [recipe_one.id])
+
+    def test_filter_recipes_invalid_mode(self):
+        """
+        Test an unknown filter mode is rejected
+        :return: None
+        """
+        res = self.apiclient.get(RECIPE_URL, {'tags': '1',
+                                              'tags_mode': 'most'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
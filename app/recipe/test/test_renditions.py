@@ -0,0 +1,204 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.renditions import get_source_hash, rendition_cache
+
+
+def rendition_url(recipe_id):
+    """
+    Return the image rendition url of a recipe
+    :param recipe_id: recipe object id
+    :return: url
+    """
+    return reverse('recipe:recipe-image-rendition', args=[recipe_id])
+
+
+def jpeg_bytes(size=(400, 200)):
+    """
+    Return an encoded JPEG image
+    :param size: width and height
+    :return: bytes
+    """
+    file = io.BytesIO()
+    Image.new('RGB', size, color='red').save(file, format='JPEG')
+
+    return file.getvalue()
+
+
+class RecipeRenditionTest(TestCase):
+    """
+    Test generating and caching resized recipe images
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=os.path.join(self.temp_dir, 'media'),
+            IMAGE_RENDITIONS={
+                'ROOT': os.path.join(self.temp_dir, 'renditions'),
+                'MAX_BYTES': 10 ** 6,
+                'LOW_WATER': 0.7,
+                'WIDTHS': (64, 128, 1024),
+                'DEFAULT_QUALITY': 80,
+            }
+        )
+        self.settings.enable()
+        rendition_cache.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5,
+            image_status=Recipe.IMAGE_READY
+        )
+        self.recipe.image.save('image.jpg', ContentFile(jpeg_bytes()))
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def get_rendition(self, **params):
+        """
+        Request a rendition, following the redirect to the versioned url
+        :param params: query parameters
+        :return: Response object
+        """
+        res = self.apiclient.get(rendition_url(self.recipe.id), params)
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+
+        return self.apiclient.get(res['Location'])
+
+    def test_rendition_resized_and_cached(self):
+        """
+        Test a rendition is resized, cacheable forever, and generated once
+        :return: None
+        """
+        res = self.get_rendition(width=128, image_format='webp')
+        content = b''.join(res.streaming_content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('immutable', res['Cache-Control'])
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.size, (128, 64))
+
+        files = rendition_cache._list_files()
+        self.assertEqual(len(files), 1)
+        with patch('recipe.views.render_image') as render_image:
+            res = self.get_rendition(width=128, image_format='webp')
+        render_image.assert_not_called()
+        self.assertEqual(b''.join(res.streaming_content), content)
+
+    def test_rendition_never_upscaled(self):
+        """
+        Test asking for a width above the source keeps the source size
+        :return: None
+        """
+        res = self.get_rendition(width=1024)
+
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (400, 200))
+
+    def test_rendition_redirects_after_new_image(self):
+        """
+        Test a new image changes the versioned url
+        :return: None
+        """
+        first = self.apiclient.get(rendition_url(self.recipe.id),
+                                   {'width': 64})
+        self.recipe.image.save('image.jpg',
+                               ContentFile(jpeg_bytes((100, 100))))
+
+        second = self.apiclient.get(first['Location'])
+
+        self.assertEqual(second.status_code, status.HTTP_302_FOUND)
+        self.assertNotEqual(second['Location'], first['Location'])
+
+    def test_source_hash_from_content_name(self):
+        """
+        Test the source hash of a content addressed image comes from its
+        name without reading the file
+        :return: None
+        """
+        digest = hashlib.sha256(jpeg_bytes()).hexdigest()
+
+        with patch.object(self.recipe.image.storage, 'open') as storage_open:
+            self.assertEqual(get_source_hash(self.recipe.image), digest)
+        storage_open.assert_not_called()
+
+    def test_source_hash_of_other_names(self):
+        """
+        Test images stored under other names are hashed from their content
+        :return: None
+        """
+        content = jpeg_bytes()
+        name = FileSystemStorage().save('legacy/image.jpg',
+                                        ContentFile(content))
+        self.recipe.image.name = name
+
+        self.assertEqual(get_source_hash(self.recipe.image),
+                         hashlib.sha256(content).hexdigest())
+
+    def test_rendition_invalid_params(self):
+        """
+        Test unsupported widths and formats are rejected
+        :return: None
+        """
+        for params in ({'width': 100}, {'width': 64, 'image_format': 'bmp'},
+                       {'width': 64, 'quality': 0}):
+            res = self.apiclient.get(rendition_url(self.recipe.id), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rendition_without_image(self):
+        """
+        Test a recipe without a processed image has no renditions
+        :return: None
+        """
+        self.recipe.image_status = Recipe.IMAGE_PENDING
+        self.recipe.save()
+
+        res = self.apiclient.get(rendition_url(self.recipe.id),
+                                 {'width': 64})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_evicts_least_recently_used(self):
+        """
+        Test going over the size limit evicts the least recently used
+        renditions down to the low water mark
+        :return: None
+        """
+        now = time.time()
+        for i in range(3):
+            rendition_cache.set(f'key{i}', b'x' * 300000)
+            os.utime(rendition_cache.get_path(f'key{i}'),
+                     (now - 100 + i, now - 100 + i))
+        rendition_cache.open('key0').close()
+
+        rendition_cache.set('key3', b'x' * 300000)
+
+        remaining = sorted(os.path.basename(path)
+                           for _, _, path in rendition_cache._list_files())
+        self.assertEqual(remaining, ['key0', 'key3'])
@@ -0,0 +1,145 @@
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.search import has_trigram
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+postgres_only = unittest.skipUnless(connection.vendor == 'postgresql',
+                                    'full text search needs Postgres')
+
+
+def sample_recipe(user, title):
+    """
+    Create and return a sample recipe
+    :param user: user object
+    :param title: title of the recipe
+    :return: Recipe object
+    """
+    return Recipe.objects.create(user=user, title=title, time_minutes=10,
+                                 price=5.00)
+
+
+class RecipeSearchApiTest(TestCase):
+    """
+    Test searching recipes by title
+    """
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='testpass'
+        )
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+
+    def search(self, term, **params):
+        """
+        Return the titles of the recipes found by a search
+        :param term: search term
+        :param params: other query parameters
+        :return: list of titles
+        """
+        res = self.apiclient.get(RECIPE_URL, {'search': term, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_search_matches_titles(self):
+        """
+        Test only the user's recipes with matching titles are returned
+        :return: None
+        """
+        sample_recipe(self.user, 'Thai green curry')
+        sample_recipe(self.user, 'Steak and chips')
+        other_user = get_user_model().objects.create_user(
+            email='other@test.com',
+            password='testpass'
+        )
+        sample_recipe(other_user, 'Red curry')
+
+        self.assertEqual(self.search('curry'), ['Thai green curry'])
+
+    def test_search_ranks_best_match_first(self):
+        """
+        Test the recipe titled exactly as the term comes first
+        :return: None
+        """
+        sample_recipe(self.user, 'Curry')
+        sample_recipe(self.user, 'Curry noodle soup with curry paste')
+        sample_recipe(self.user, 'Chickpea curry')
+
+        titles = self.search('curry')
+
+        self.assertEqual(len(titles), 3)
+        self.assertEqual(titles[0], 'Curry')
+
+    def test_search_results_paginated(self):
+        """
+        Test following the cursors returns every result exactly once
+        :return: None
+        """
+        for i in range(5):
+            sample_recipe(self.user, f'Curry number {i}')
+        sample_recipe(self.user, 'Curry')
+
+        titles = []
+        res = self.apiclient.get(RECIPE_URL, {'search': 'curry',
+                                              'page_size': 2})
+        while True:
+            titles += [recipe['title'] for recipe in res.data['results']]
+            if res.data['next'] is None:
+                break
+            res = self.apiclient.get(res.data['next'])
+
+        self.assertEqual(len(titles), 6)
+        self.assertEqual(len(set(titles)), 6)
+        self.assertEqual(titles[0], 'Curry')
+
+    @postgres_only
+    def test_search_matches_word_forms(self):
+        """
+        Test the search matches other forms of the words
+        :return: None
+        """
+        sample_recipe(self.user, 'Baked potatoes')
+
+        self.assertEqual(self.search('baking potato'), ['Baked potatoes'])
+
+    @postgres_only
+    def test_search_vector_follows_title(self):
+        """
+        Test the stored search vector is kept in sync with the title
+        :return: None
+        """
+        recipe = sample_recipe(self.user, 'Pancakes')
+        recipe.title = 'Waffles'
+        recipe.save()
+
+        matches = Recipe.objects.filter(
+            search_vector=SearchQuery('waffle', config='english')
+        )
+
+        self.assertEqual(list(matches), [recipe])
+
+    @postgres_only
+    def test_search_fuzzy_match(self):
+        """
+        Test misspelled terms still match when pg_trgm is installed
+        :return: None
+        """
+        if not has_trigram(connection):
+            self.skipTest('pg_trgm is not installed')
+        sample_recipe(self.user, 'Lasagne')
+
+        self.assertEqual(self.search('lasagna'), ['Lasagne'])
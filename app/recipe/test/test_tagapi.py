@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
@@ -7,10 +8,14 @@ from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
 
+from recipe.pagination import RecipeAttrPagination
 from recipe.serializers import TagSerializer
+from recipe.views import TagViewSet
 
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+TAGS_COUNTS_URL = reverse('recipe:tag-counts')
 
 
 class PublicTagApiTest(TestCase):
@@ -53,6 +58,8 @@ class PrivateTagApiTest(TestCase):
         )
         self.apiclient = APIClient()
         self.apiclient.force_authenticate(self.user)
+        cache.clear()
+        TagViewSet.list_cache.reset_stats()
 
     def test_retrieve_tags(self):
         """
@@ -74,7 +81,7 @@ class PrivateTagApiTest(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """
@@ -97,8 +104,8 @@ class PrivateTagApiTest(TestCase):
         res = self.apiclient.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """
@@ -152,8 +159,8 @@ class PrivateTagApiTest(TestCase):
         serializer_one = TagSerializer(tag_one)
         serializer_two = TagSerializer(tag_two)
 
-        self.assertIn(serializer_one.data, res.data)
-        self.assertNotIn(serializer_two.data, res.data)
+        self.assertIn(serializer_one.data, res.data['results'])
+        self.assertNotIn(serializer_two.data, res.data['results'])
 
     def test_retrieve_tags_assigned_unique(self):
         """
@@ -185,4 +192,276 @@ class PrivateTagApiTest(TestCase):
 
         res = self.apiclient.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_retrieve_tags_paginated_by_cursor(self):
+        """
+        Test paging through tags keeps the name descending order and
+        does not skip or repeat tags
+        :return: None
+        """
+        for name in ('Vegan', 'Dessert', 'Curry', 'Breakfast', 'Soup'):
+            Tag.objects.create(user=self.user, name=name)
+
+        seen = []
+        url = TAGS_URL
+        params = {'page_size': 2}
+        while url:
+            res = self.apiclient.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            seen.extend(res.data['results'])
+            url, params = res.data['next'], None
+
+        tags = Tag.objects.filter(user=self.user).order_by('-name', 'id')
+        self.assertEqual(seen, TagSerializer(tags, many=True).data)
+
+    def test_retrieve_tags_cursor_wrong_types(self):
+        """
+        Test a tag cursor whose values do not fit the ordering columns
+        is rejected
+        :return: None
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+        pagination = RecipeAttrPagination()
+
+        for position in ([1, {'a': 1}, 1], [1, 'Vegan', 'x'], [1, None, 1]):
+            with self.subTest(position=position):
+                res = self.apiclient.get(TAGS_URL, {
+                    'cursor': pagination.encode_cursor(position)
+                })
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_tags_cached(self):
+        """
+        Test a repeated tag list is served from the cache
+        :return: None
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res_one = self.apiclient.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            res_two = self.apiclient.get(TAGS_URL)
+
+        self.assertEqual(res_two.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_two.data, res_one.data)
+        self.assertEqual(TagViewSet.list_cache.stats(),
+                         {'hits': 1, 'misses': 1})
+
+    def test_create_tag_invalidates_cache(self):
+        """
+        Test creating a tag invalidates the cached tag list
+        :return: None
+        """
+        self.apiclient.get(TAGS_URL)
+        self.apiclient.post(TAGS_URL, {'name': 'Dessert'})
+
+        res = self.apiclient.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Dessert')
+        self.assertEqual(TagViewSet.list_cache.stats()['hits'], 0)
+
+    def test_assigned_only_invalidated_on_recipe_link(self):
+        """
+        Test linking a tag to a recipe invalidates the cached
+        assigned_only list
+        :return: None
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='title',
+            time_minutes=10,
+            price=10,
+        )
+        res = self.apiclient.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data['results'], [])
+
+        recipe.tags.add(tag)
+        res = self.apiclient.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data['results'], [TagSerializer(tag).data])
+
+    def test_retrieve_tags_not_modified(self):
+        """
+        Test a tag list request with a current ETag returns 304 and
+        a stale ETag returns the list
+        :return: None
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.apiclient.get(TAGS_URL)['ETag']
+
+        res = self.apiclient.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Tag.objects.create(user=self.user, name='Dessert')
+        res = self.apiclient.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_tag_counts(self):
+        """
+        Test counting the recipes of each tag, optionally over the
+        recipes matching the tag filters only
+        :return: None
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        unused = Tag.objects.create(user=self.user, name='Unused')
+        for i in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'R{i}',
+                                           time_minutes=10, price=10)
+            recipe.tags.add(vegan)
+            if i == 0:
+                recipe.tags.add(quick)
+
+        with self.assertNumQueries(2):
+            res = self.apiclient.get(TAGS_COUNTS_URL)
+        filtered = self.apiclient.get(TAGS_COUNTS_URL, {'tags': quick.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': vegan.id, 'name': 'Vegan', 'recipes': 3},
+            {'id': unused.id, 'name': 'Unused', 'recipes': 0},
+            {'id': quick.id, 'name': 'Quick', 'recipes': 1},
+        ])
+        self.assertEqual(
+            [tag['recipes'] for tag in filtered.data], [1, 0, 1]
+        )
+
+    def test_tag_counts_cached_until_data_changes(self):
+        """
+        Test the counts are served from the cache until a recipe
+        changes
+        :return: None
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.apiclient.get(TAGS_COUNTS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.apiclient.get(TAGS_COUNTS_URL)
+        self.assertEqual(res.data[0]['recipes'], 0)
+
+        recipe = Recipe.objects.create(user=self.user, title='Curry',
+                                       time_minutes=10, price=10)
+        recipe.tags.add(tag)
+        res = self.apiclient.get(TAGS_COUNTS_URL)
+
+        self.assertEqual(res.data[0]['recipes'], 1)
+
+    def test_create_tag_duplicate_name_invalid(self):
+        """
+        Test creating a tag whose name the user already has, in any
+        case, is rejected
+        :return: None
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.apiclient.post(TAGS_URL, {'name': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_upsert_tags(self):
+        """
+        Test bulk upserting tags returns every name's id and only
+        creates the missing ones
+        :return: None
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        user_two = get_user_model().objects.create_user(
+            email='test6@test6.com',
+            password='password1',
+        )
+        Tag.objects.create(user=user_two, name='Dessert')
+
+        res = self.apiclient.post(
+            TAGS_BULK_URL,
+            {'names': ['vegan', 'Dessert', 'Curry', 'dessert']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['Vegan', 'Dessert', 'Curry'])
+        self.assertEqual(res.data[0]['id'], vegan.id)
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(tags.count(), 3)
+        self.assertEqual(res.data, TagSerializer(
+            [tags.get(id=tag['id']) for tag in res.data], many=True
+        ).data)
+
+    def test_bulk_upsert_existing_tags_without_insert(self):
+        """
+        Test bulk upserting names that all exist reads the tags in one
+        query
+        :return: None
+        """
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        with self.assertNumQueries(1):
+            res = self.apiclient.post(
+                TAGS_BULK_URL,
+                {'names': ['Dessert', 'Vegan']},
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_bulk_upsert_non_ascii_tags(self):
+        """
+        Test bulk upserting names whose case folding differs between
+        Python and the database, twice, creates each tag once
+        :return: None
+        """
+        names = ['ÄPFEL', 'ΣΟΦΟΣ', 'İstanbul']
+
+        for _ in range(2):
+            res = self.apiclient.post(TAGS_BULK_URL, {'names': names},
+                                      format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual([tag['name'] for tag in res.data], names)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_upsert_most_tags(self):
+        """
+        Test bulk upserting the most names allowed stays within the
+        query parameter limit of the database
+        :return: None
+        """
+        names = [f'Tag {i}' for i in range(1000)]
+
+        res = self.apiclient.post(TAGS_BULK_URL, {'names': names},
+                                  format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1000)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1000)
+
+    def test_create_non_ascii_tag_twice(self):
+        """
+        Test creating a tag with a non ASCII name it already has fails
+        validation rather than the unique index
+        :return: None
+        """
+        self.apiclient.post(TAGS_URL, {'name': 'ΣΟΦΟΣ'})
+
+        res = self.apiclient.post(TAGS_URL, {'name': 'ΣΟΦΟΣ'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_upsert_tags_invalid(self):
+        """
+        Test bulk upserting requires a non empty list of names
+        :return: None
+        """
+        res = self.apiclient.post(TAGS_BULK_URL, {'names': []},
+                                  format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
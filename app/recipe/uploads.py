@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    """
+    Raised when an uploaded file goes over the size limit
+    """
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler streaming files to a temporary file chunk by chunk,
+    so memory use does not grow with the upload, and refusing files
+    over IMAGE_UPLOAD['MAX_BYTES'] as soon as the limit is crossed
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        if max_bytes is None:
+            max_bytes = settings.IMAGE_UPLOAD['MAX_BYTES']
+        self.max_bytes = max_bytes
+        self.received = 0
+
+    def new_file(self, *args, **kwargs):
+        """
+        Start a new file, counting its bytes from zero
+        :return: None
+        """
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        """
+        Write a chunk to the temporary file, unless it goes over the limit
+        :param raw_data: bytes of the chunk
+        :param start: offset of the chunk in the file
+        :return: None
+        """
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.file.close()
+            raise UploadTooLarge(
+                f'Uploaded file is larger than {self.max_bytes} bytes.'
+            )
+        super().receive_data_chunk(raw_data, start)
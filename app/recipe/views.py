@@ -1,22 +1,54 @@
+import io
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import (CharField, Count, Exists, OuterRef, Prefetch,
+                              Value)
+from django.http import FileResponse, StreamingHttpResponse
+from django.db.models.functions import Lower
+
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+from rest_framework.utils.urls import replace_query_param
 
+from core.authentication import CachedTokenAuthentication
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
 from core.models import Tag, Ingredient, Recipe
 
 from recipe import serializers
+from recipe.cache import ListResponseCache, bump_data_version
+from recipe.export import EXPORT_FORMATS, iter_recipe_rows
+from recipe.filters import RECIPE_FILTERS
+from recipe.images import image_queue
+from recipe.mixins import ConditionalGetMixin, FastListMixin
+from recipe.pagination import (RecipePagination, RecipeAttrPagination,
+                               RecipeSearchPagination)
+from recipe.renditions import (RENDITION_FORMATS, get_source_hash,
+                               render_image, rendition_cache)
+from recipe.search import search_recipes
+from recipe.uploads import BoundedTemporaryFileUploadHandler
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(ConditionalGetMixin,
+                            FastListMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """
     Base viewset for user owned recipe attributes
     """
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    parser_classes = (FastJSONParser, FormParser, MultiPartParser)
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """
@@ -26,12 +58,52 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # Filtering on the expression itself, rather than on an
+            # annotation, compiles to a bare WHERE EXISTS that Postgres
+            # plans as a semi join
+            queryset = queryset.filter(Exists(
+                self.recipe_through.objects.filter(
+                    **{self._get_through_column(): OuterRef('pk')}
+                )
+            ))
 
-        return queryset.filter(user=self.request.user).\
-            order_by('-name').distinct()
+        return queryset.order_by('-name', 'id')
+
+    def _get_through_column(self):
+        """
+        Return the column referencing the objects in the recipe through
+        table
+        :return: column name
+        """
+        return f'{self.queryset.model._meta.model_name}_id'
+
+    def list(self, request, *args, **kwargs):
+        """
+        Return the list, or 304 if the client's copy is current
+        :param request: request object
+        :return: Response object
+        """
+        return self.conditional_response(
+            self._cached_list, request, *args, **kwargs
+        )
+
+    def _cached_list(self, request, *args, **kwargs):
+        """
+        Return the list from the cache while the user's data is unchanged
+        :param request: request object
+        :return: Response object
+        """
+        key = self.list_cache.get_key(request)
+        data = self.list_cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = self.fast_list(request, *args, **kwargs)
+        self.list_cache.set(key, response.data)
+
+        return response
 
     def perform_create(self, serializer):
         """
@@ -41,6 +113,127 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         """
         serializer.save(user=self.request.user)
 
+    def _get_by_name(self, names):
+        """
+        Return the user's objects whose name matches one of names
+        regardless of case. Both sides are lowercased by the database,
+        like its unique index on the lowercased name, in batches that
+        stay within the query parameter limit of the database.
+        :param names: list of names
+        :return: dict of lowercased name to object
+        """
+        batch_size = (connection.features.max_query_params or
+                      len(names) + 1) - 1
+        found = {}
+        for start in range(0, len(names), batch_size):
+            queryset = self.queryset.model.objects.annotate(
+                normalized=Lower('name')
+            ).filter(user=self.request.user, normalized__in=[
+                Lower(Value(name, CharField()))
+                for name in names[start:start + batch_size]
+            ])
+            found.update((obj.name.lower(), obj) for obj in queryset)
+
+        return found
+
+    def _upsert(self, names):
+        """
+        Return the objects with the given names, creating the missing
+        ones. Names match regardless of case.
+        :param names: list of names
+        :return: list of objects, one per distinct name, in input order
+        """
+        model = self.queryset.model
+        user = self.request.user
+        wanted = {}
+        for name in names:
+            wanted.setdefault(name.lower(), name)
+
+        found = self._get_by_name(list(wanted.values()))
+        missing = [key for key in wanted if key not in found]
+        if missing:
+            model.objects.bulk_create(
+                [model(user=user, name=wanted[key]) for key in missing],
+                ignore_conflicts=True
+            )
+            found.update(self._get_by_name([wanted[key] for key in missing]))
+            bump_data_version(user.id)
+
+        # A conflicting row deleted before it was read back, or one the
+        # database lowercases unlike Python, is left out
+        return [found[key] for key in wanted if key in found]
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """
+        Return the ids of a list of names, creating the missing ones
+        :param request: request object
+        :return: Response object
+        """
+        serializer = serializers.RecipeAttrBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        objects = self._upsert(serializer.validated_data['names'])
+
+        return Response(self.get_serializer(objects, many=True).data)
+
+    @action(methods=['GET'], detail=False, url_path='counts')
+    def counts(self, request):
+        """
+        Return the number of recipes using each object, or 304 if the
+        client's copy is current. The tags and ingredients parameters
+        filter the recipes counted, as on the recipe list.
+        :param request: request object
+        :return: Response object
+        """
+        return self.conditional_response(self._cached_counts, request)
+
+    def _cached_counts(self, request):
+        """
+        Return the counts from the cache while the user's data is
+        unchanged
+        :param request: request object
+        :return: Response object
+        """
+        key = self.counts_cache.get_key(request)
+        data = self.counts_cache.get(key)
+        if data is None:
+            data = self._get_counts()
+            self.counts_cache.set(key, data)
+
+        return Response(data)
+
+    def _get_counts(self):
+        """
+        Count the filtered recipes of each of the user's objects with a
+        single GROUP BY over the recipe through table
+        :return: list of dicts with the id, name and recipe count
+        """
+        model = self.queryset.model
+        column = self._get_through_column()
+        recipes = Recipe.objects.filter(user=self.request.user)
+        for related_filter in RECIPE_FILTERS:
+            recipes = related_filter.filter_queryset(
+                recipes, self.request.query_params
+            )
+
+        counts = dict(
+            self.recipe_through.objects.
+            filter(recipe_id__in=recipes.values('id')).
+            values_list(column).annotate(recipes=Count('recipe_id')).
+            order_by()
+        )
+        objects = model.objects.filter(user=self.request.user).\
+            order_by('-name', 'id').values_list('id', 'name')
+
+        return [
+            {'id': pk, 'name': name, 'recipes': counts.get(pk, 0)}
+            for pk, name in objects
+        ]
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """
@@ -48,6 +241,9 @@ class TagViewSet(BaseRecipeAttrViewSet):
     """
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_through = Recipe.tags.through
+    list_cache = ListResponseCache('tag-list')
+    counts_cache = ListResponseCache('tag-counts')
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -56,41 +252,104 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_through = Recipe.ingredients.through
+    list_cache = ListResponseCache('ingredient-list')
+    counts_cache = ListResponseCache('ingredient-counts')
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    FastListMixin,
+                    viewsets.ModelViewSet):
     """
     Manage recipes in the database
     """
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    parser_classes = (FastJSONParser, FormParser, MultiPartParser)
+    pagination_class = RecipePagination
+    search_pagination_class = RecipeSearchPagination
+    max_batch_size = 1000
+    related_filters = RECIPE_FILTERS
+    export_chunk_size = 2000
+
+    def _get_related_fields(self, serializer_class, field_name):
+        """
+        Return the columns the serializer reads from a related object
+        :param serializer_class: serializer of the recipes
+        :param field_name: name of the many to many field on the serializer
+        :return: tuple of column names
+        """
+        field = serializer_class._declared_fields[field_name]
+        if isinstance(field, ListSerializer):
+            return field.child.Meta.fields
+
+        return ('id',)
 
-    def _params_to_int(self, qs):
+    def _get_prefetches(self, serializer_class):
         """
-        Convert a list of string ids to a list on integers
-        :param qs: query set
-        :return: list of integers
+        Plan the prefetches needed to serialize the recipes without
+        issuing a query per recipe
+        :param serializer_class: serializer of the recipes
+        :return: list of Prefetch objects
         """
-        return [int(str_id) for str_id in qs.split(',')]
+        return [
+            Prefetch(
+                'tags',
+                queryset=Tag.objects.only(
+                    *self._get_related_fields(serializer_class, 'tags')
+                ).order_by('id')
+            ),
+            Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.only(
+                    *self._get_related_fields(serializer_class, 'ingredients')
+                ).order_by('id')
+            ),
+        ]
 
     def get_queryset(self):
         """
-        Retrieve the recipes for the authenticated user
+        Retrieve the recipes for the authenticated user, filtered by the
+        tags, ingredients and search query parameters
         :return: recipe object
         """
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
-        if tags:
-            tags_ids = self._params_to_int(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_int(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        for related_filter in self.related_filters:
+            queryset = related_filter.filter_queryset(
+                queryset, self.request.query_params
+            )
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related(
+                *self._get_prefetches(self.get_serializer_class())
+            )
+        queryset = queryset.filter(user=self.request.user)
+
+        search = self._get_search_term()
+        if search:
+            return search_recipes(queryset, search).order_by('-rank', '-id')
+
+        return queryset.order_by('-id')
+
+    def _get_search_term(self):
+        """
+        Return the search term of the request
+        :return: search term, empty when not searching
+        """
+        return self.request.query_params.get('search', '').strip()
 
-        return queryset.filter(user=self.request.user)
+    @property
+    def paginator(self):
+        """
+        Return the paginator, ordering by relevance when searching
+        :return: paginator object
+        """
+        if not hasattr(self, '_paginator') and self._get_search_term():
+            self._paginator = self.search_pagination_class()
+
+        return super().paginator
 
     def get_serializer_class(self):
         """
@@ -99,11 +358,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'image_status'):
             return serializers.RecipeImageSerializer
+        elif self.action == 'image_rendition':
+            return serializers.RecipeRenditionSerializer
+        elif self.action == 'batch':
+            return serializers.RecipeBatchSerializer
 
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """
+        List recipes, or return 304 if the client's copy is current
+        :param request: request object
+        :return: Response object
+        """
+        return self.conditional_response(
+            self.fast_list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a recipe, or return 304 if the client's copy is current
+        :param request: request object
+        :return: Response object
+        """
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
     def perform_create(self, serializer):
         """
         Create a new recipe
@@ -112,28 +395,177 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """
+        Create a list of recipes in one transaction
+        :param request: request object
+        :return: Response object
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'non_field_errors': ['Expected a list of recipes.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.max_batch_size:
+            return Response(
+                {'non_field_errors': [
+                    f'Ensure a batch has no more than '
+                    f'{self.max_batch_size} recipes.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipes = serializer.save(user=request.user)
+
+        queryset = Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes]
+        ).prefetch_related(
+            *self._get_prefetches(serializers.RecipeSerializer)
+        ).order_by('id')
+        output = serializers.RecipeSerializer(queryset, many=True)
+
+        return Response(output.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """
+        Stream all the recipes of the user with their tag and ingredient
+        names, as NDJSON or CSV depending on the export_format parameter
+        :param request: request object
+        :return: StreamingHttpResponse object
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'export_format': [
+                    f'Expected one of {", ".join(EXPORT_FORMATS)}.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        content_type, encode = EXPORT_FORMATS[export_format]
+
+        rows = iter_recipe_rows(self.get_queryset(), self.export_chunk_size)
+        response = StreamingHttpResponse(
+            encode(rows),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_format}"'
+
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """
-        Upload an image to a recipe
+        Store an image upload for a recipe and queue its processing. The
+        upload is streamed to a temporary file, bounded in size, and
+        moved into the media storage once its header checks out.
         :param request: request object
         :param pk: id of the recipe object
         :return: Response object
         """
+        # Must be replaced before request.data is first read
+        request._request.upload_handlers = [
+            BoundedTemporaryFileUploadHandler(request._request)
+        ]
         recipe = self.get_object()
         serializer = self.get_serializer(
             recipe,
             data=request.data
         )
-        print(serializer)
-        if serializer.is_valid():
-            serializer.save()
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if image_queue.full():
+            return Response(
+                {'detail': 'Too many images waiting for processing.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'}
+            )
+
+        previous = recipe.image.name
+        recipe = serializer.save(image_status=Recipe.IMAGE_PENDING)
+        if previous:
+            recipe.image.storage.delete(previous)
+        transaction.on_commit(
+            partial(image_queue.submit, recipe.id, recipe.image.name)
+        )
+
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=['GET'], detail=True, url_path='image-status')
+    def image_status(self, request, pk=None):
+        """
+        Return the processing status of a recipe image
+        :param request: request object
+        :param pk: id of the recipe object
+        :return: Response object
+        """
+        serializer = self.get_serializer(self.get_object())
+
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=True, url_path='image-rendition')
+    def image_rendition(self, request, pk=None):
+        """
+        Return the recipe image resized to a width, in the image_format
+        and quality requested, generating it on the first request. The
+        url is redirected to one carrying the source content hash, which
+        is then cacheable forever.
+        :param request: request object
+        :param pk: id of the recipe object
+        :return: FileResponse or Response object
+        """
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not recipe.image or recipe.image_status != Recipe.IMAGE_READY:
+            raise NotFound('The recipe has no processed image.')
+
+        params = serializer.validated_data
+        source_hash = get_source_hash(recipe.image)
+        if params.get('v') != source_hash:
             return Response(
-                serializer.data,
-                status=status.HTTP_200_OK
+                status=status.HTTP_302_FOUND,
+                headers={
+                    'Location': replace_query_param(
+                        request.build_absolute_uri(), 'v', source_hash
+                    ),
+                    'Cache-Control': 'private, no-cache',
+                }
             )
 
-        return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
+        key = rendition_cache.get_key(
+            source_hash, params['width'], params['image_format'],
+            params['quality']
+        )
+        file = rendition_cache.open(key)
+        if file is None:
+            with recipe.image.open('rb') as source:
+                data = render_image(
+                    source, params['width'], params['image_format'],
+                    params['quality']
+                )
+            rendition_cache.set(key, data)
+            file = io.BytesIO(data)
+
+        response = FileResponse(
+            file,
+            content_type=RENDITION_FORMATS[params['image_format']][1]
         )
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+
+        return response
@@ -1,7 +1,12 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
@@ -10,6 +15,8 @@ class CreateUserView(generics.CreateAPIView):
     Create a user using the serialize and store it in database
     """
     serializer_class = UserSerializer
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    parser_classes = (FastJSONParser, FormParser, MultiPartParser)
 
 
 class CreateTokenView(ObtainAuthToken):
@@ -25,8 +32,10 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     Manage the authenticated user
     """
     serializer_class = UserSerializer
-    authentication_classes = {authentication.TokenAuthentication}
+    authentication_classes = {CachedTokenAuthentication}
     permission_classes = {permissions.IsAuthenticated}
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    parser_classes = (FastJSONParser, FormParser, MultiPartParser)
 
     def get_object(self):
         """